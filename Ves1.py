@@ -3,7 +3,7 @@ from tkinter import ttk, messagebox
 import serial
 import serial.tools.list_ports
 import time
-from datetime import datetime
+from weight_recorder import WeightRecorder, MANUAL
 
 class WeighingScaleApp:
     def __init__(self, root):
@@ -21,7 +21,11 @@ class WeighingScaleApp:
         self.is_connected = False
         self.decimal_places = 3  # По умолчанию 3 знака после запятой
         
+        # Записанные веса хранятся в базе SQLite (раньше - weights.txt)
+        self.recorder = WeightRecorder("weights.db")
+        
         self.create_widgets()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def create_widgets(self):
         # Фрейм для подключения
@@ -216,15 +220,20 @@ class WeighingScaleApp:
     def save_weight(self):
         if self.is_connected:
             try:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                weight = self.weight_var.get()
+                weight = float(self.weight_var.get())
                 mode = self.gross_net_var.get()
-                with open("weights.txt", "a", encoding='utf-8') as f:
-                    f.write(f"{timestamp} - {weight} кг ({mode})\n")
+                self.recorder.add_weighing(self.port_var.get(), time.time(), weight,
+                                           kind=MANUAL, mode=mode)
                 self.status_var.set("Вес записан")
             except Exception as e:
                 self.status_var.set(f"Ошибка записи: {str(e)}")
-                messagebox.showerror("Ошибка", f"Ошибка записи в файл: {str(e)}")
+                messagebox.showerror("Ошибка", f"Ошибка записи в базу: {str(e)}")
+    
+    def on_close(self):
+        if self.is_connected:
+            self.disconnect()
+        self.recorder.close()
+        self.root.destroy()
 
 if __name__ == "__main__":
     try:
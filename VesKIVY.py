@@ -13,10 +13,18 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.clock import Clock
 from kivy.graphics import Color, Rectangle
 from kivy.core.window import Window
-from kivy.properties import ObjectProperty, StringProperty, NumericProperty, ListProperty
+from kivy.properties import ObjectProperty, StringProperty, NumericProperty
 from serial import Serial, SerialException
 from threading import Thread
 from queue import Queue
+from collections import deque
+import time
+from kivy_chart import WeightChart
+from kivy_log_view import LogView
+from weight_stats import ScaleStats
+from alerts import AlertManager
+from stability import StabilityDetector
+from scale_trace import Tracer, FRAME
 
 from kivy.uix.spinner import Spinner
 from kivy.uix.label import Label
@@ -56,8 +64,8 @@ class WeightScaleApp(TabbedPanel):
     protocol = StringProperty("Auto")
     current_weight = StringProperty("---")
     status = StringProperty("Не подключено")
-    log_text = StringProperty("")
-    weight_history = ListProperty([])
+    stats_text = StringProperty("")
+    alert_text = StringProperty("")
     target_weight = NumericProperty(0)
     is_connected = False
 
@@ -76,6 +84,16 @@ class WeightScaleApp(TabbedPanel):
         super().__init__(**kwargs)
         self.serial = None
         self.data_queue = Queue()
+        self.weight_history = deque(maxlen=100)
+        self.ids.weight_chart.history = self.weight_history
+        self.stats = ScaleStats()
+        self.alerts = AlertManager()
+        # Целевой вес проверяется только по событию стабилизации, а не на каждом кадре
+        self.stability = StabilityDetector()
+        self.stability.subscribe(self.on_stable_weight)
+        self.tracer = Tracer(self.log_message)
+        self._alert_hide_event = None
+        Clock.schedule_interval(self.process_alerts, 0.1)
         self.protocol_info = {
             "MIDL-MI-VDA": {
                 "description": "Протокол МИДЛ МИ ВДА/12Я\nФормат: W +123.45 kg\nКоманды: Z - тара, CAL - калибровка",
@@ -173,16 +191,22 @@ class WeightScaleApp(TabbedPanel):
             
             if weight is not None:
                 self.current_weight = f"{weight:.3f} {unit}"
-                self.weight_history.append(weight)
-                if len(self.weight_history) > 100:
-                    self.weight_history.pop(0)
-                self.log_message(f"Получено: {data}")
-                
-                if self.target_weight and abs(weight - self.target_weight) < 0.001:
-                    self.notify_target_weight()
+                self.weight_history.append((time.time(), weight))
+                self.stats.add(time.time(), weight)
+                window = self.stats["10 с"]
+                self.stats_text = (
+                    f"За 10 с: среднее {window.mean:.3f}, σ {window.std:.3f}, "
+                    f"мин {window.min:.3f}, макс {window.max:.3f}, скорость {window.slope:+.3f} кг/с"
+                )
+                self.tracer.trace(FRAME, "Получено: {}", data)
+                self.stability.add(time.time(), weight)
         except Exception as e:
             self.log_message(f"Ошибка обработки данных: {str(e)}")
 
+    def on_stable_weight(self, event):
+        self.log_message(f"Стабильный вес: {event.weight:.3f} кг")
+        self.alerts.check_target(event.timestamp, event.weight)
+
     def send_zero_command(self):
         if not self.is_connected:
             return
@@ -221,11 +245,21 @@ class WeightScaleApp(TabbedPanel):
         except ValueError:
             self.show_popup("Ошибка", "Введите корректное значение веса")
 
-    def notify_target_weight(self):
-        self.log_message(f"Достигнут целевой вес: {self.target_weight} кг")
-        self.target_weight = 0
-        self.ids.target_input.text = ""
-        self.show_popup("Уведомление", "Достигнут целевой вес!")
+    def on_target_weight(self, instance, value):
+        self.alerts.set_target(value if value > 0 else None)
+
+    def process_alerts(self, dt):
+        for event in self.alerts.pop_events():
+            if event.active:
+                self.log_message(event.message)
+                self.show_alert_banner(event.message)
+
+    def show_alert_banner(self, message):
+        # Немодальный баннер вместо всплывающего окна, скрывается через 5 с
+        self.alert_text = message
+        if self._alert_hide_event is not None:
+            self._alert_hide_event.cancel()
+        self._alert_hide_event = Clock.schedule_once(lambda dt: setattr(self, 'alert_text', ''), 5)
 
     def show_popup(self, title, message):
         content = Button(text='OK', size_hint=(1, 0.2))
@@ -233,9 +267,12 @@ class WeightScaleApp(TabbedPanel):
         content.bind(on_press=popup.dismiss)
         popup.open()
 
+    def set_trace(self, category, enabled):
+        self.tracer.set_enabled(category, enabled)
+
     def log_message(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text += f"[{timestamp}] {message}\n"
+        self.ids.log_view.append_line(f"[{timestamp}] {message}")
 
     def refresh_ports(self):
         ports = ["COM{}".format(i + 1) for i in range(256)]
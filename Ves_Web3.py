@@ -11,6 +11,10 @@ from PyQt5.QtCore import QIODevice, QTimer, Qt, QUrl
 from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis
 from PyQt5.QtGui import QPainter, QColor, QFont
 from PyQt5.QtMultimedia import QSoundEffect
+from qt_log_view import BufferedLogView
+from app_settings import read_settings, write_settings, widget_value, set_widget_value
+
+SETTINGS_FILE = "ves_web3_settings.json"
 
 class WeightScaleApp(QMainWindow):
     def __init__(self):
@@ -29,6 +33,12 @@ class WeightScaleApp(QMainWindow):
         self.sound_effect = QSoundEffect()
         self.sound_effect.setSource(QUrl.fromLocalFile("beep.wav"))
         
+        # Настройки читаются до построения интерфейса: последний рабочий порт
+        # и определенный протокол нужны сразу, чтобы подключиться без ожидания
+        self.settings = read_settings(SETTINGS_FILE, {"auto_connect": True})
+        self.cached_protocol = self.settings.get("cached_protocol")
+        self.last_good_port = self.settings.get("last_good_port")
+        
         self.init_ui()
         self.init_serial_settings()
         self.init_chart()
@@ -154,8 +164,8 @@ class WeightScaleApp(QMainWindow):
         log_group = QGroupBox("Лог")
         log_layout = QVBoxLayout()
         
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
+        # Ограниченный лог с пакетным добавлением строк
+        self.log_text = BufferedLogView(max_lines=5000)
         
         self.save_log_button = QPushButton("Сохранить лог в файл")
         self.save_log_button.clicked.connect(self.save_log_to_file)
@@ -175,6 +185,8 @@ class WeightScaleApp(QMainWindow):
         # Таймер для периодического опроса весов
         self.timer = QTimer()
         self.timer.timeout.connect(self.read_data)
+        # Данные читаются сразу по приходу, таймер остается как подстраховка
+        self.serial.readyRead.connect(self.read_data)
         self.timer.setInterval(500)
     
     def init_settings_tab(self):
@@ -447,7 +459,7 @@ class WeightScaleApp(QMainWindow):
                 self.log_message(f"Параметры: {self.settings_label.text()}")
                 
                 # Попытка автоопределения протокола
-                if self.protocol_combo.currentText() == "Auto":
+                if self.protocol_combo.currentText() == "Auto" and self.current_protocol is None:
                     self.detect_protocol()
             else:
                 QMessageBox.critical(self, "Ошибка", "Не удалось открыть порт!")
@@ -511,7 +523,7 @@ class WeightScaleApp(QMainWindow):
         self.settings_label.setText(settings_text)
     
     def read_data(self):
-        if self.serial.isOpen() and self.serial.canReadLine():
+        while self.serial.isOpen() and self.serial.canReadLine():
             data = self.serial.readLine().data().decode().strip()
             self.process_weight_data(data)
     
@@ -553,6 +565,11 @@ class WeightScaleApp(QMainWindow):
             self.log_message(f"Ошибка обработки данных: {str(e)}")
     
     def process_weight_value(self, weight_kg, unit, raw_data):
+        if self.last_good_port != self.serial.portName():
+            # Порт дал первый вес - запоминаем его для подключения при следующем запуске
+            self.last_good_port = self.serial.portName()
+            self.save_settings()
+        
         # Конвертация в выбранную единицу измерения
         converted_weight = weight_kg * self.units[self.current_unit]
         
@@ -760,6 +777,8 @@ class WeightScaleApp(QMainWindow):
         wb.save(file_name)
     
     def change_protocol(self, protocol):
+        if protocol != "Auto":
+            self.cached_protocol = protocol
         if protocol == "Auto":
             self.current_protocol = None
             self.protocol_info.setText("Режим автоопределения протокола. Программа будет пытаться автоматически определить формат данных.")
@@ -880,17 +899,53 @@ class WeightScaleApp(QMainWindow):
         app.setStyle(QStyleFactory.create(theme_name))
         self.log_message(f"Установлена тема: {theme_name}")
     
+    def settings_widgets(self):
+        return {
+            "baud_rate": self.baud_combo,
+            "data_bits": self.data_bits_combo,
+            "parity": self.parity_combo,
+            "stop_bits": self.stop_bits_combo,
+            "flow_control": self.flow_control_combo,
+            "protocol": self.protocol_combo,
+            "unit": self.unit_combo,
+            "history_points": self.history_points_spin,
+            "sound": self.sound_checkbox,
+            "font_size": self.font_size_spin,
+            "font_family": self.font_family_combo,
+        }
+    
     def load_settings(self):
-        # Здесь можно реализовать загрузку настроек из файла
-        pass
+        for key, widget in self.settings_widgets().items():
+            if key in self.settings:
+                set_widget_value(widget, self.settings[key])
+        
+        # В режиме Auto сразу используем протокол, определенный в прошлый раз
+        if self.protocol_combo.currentText() == "Auto" and self.cached_protocol in self.protocols[1:]:
+            self.change_protocol(self.cached_protocol)
+            self.log_message(f"Использован сохраненный протокол: {self.cached_protocol}")
+        
+        # Переподключение к последнему порту, с которого приходил вес
+        if self.settings.get("auto_connect") and self.last_good_port:
+            if self.port_combo.findText(self.last_good_port) >= 0:
+                self.port_combo.setCurrentText(self.last_good_port)
+                QTimer.singleShot(0, self.toggle_connection)
     
     def save_settings(self):
-        # Здесь можно реализовать сохранение настроек в файл
-        pass
+        settings = dict(self.settings)
+        for key, widget in self.settings_widgets().items():
+            settings[key] = widget_value(widget)
+        settings["port"] = self.port_combo.currentText()
+        settings["cached_protocol"] = self.cached_protocol
+        settings["last_good_port"] = self.last_good_port
+        try:
+            write_settings(SETTINGS_FILE, settings)
+            self.settings = settings
+        except OSError as e:
+            self.log_message(f"Ошибка сохранения настроек: {str(e)}")
     
     def log_message(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"[{timestamp}] {message}")
+        self.log_text.append_line(f"[{timestamp}] {message}")
     
     def closeEvent(self, event):
         if self.serial.isOpen():
@@ -1,18 +1,42 @@
+import os
 import sys
-import csv
+import sqlite3
+import threading
+import time
 from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLabel, QPushButton, 
                             QVBoxLayout, QWidget, QMessageBox, QTextEdit,
                             QComboBox, QSpinBox, QHBoxLayout, QGroupBox,
                             QTabWidget, QFileDialog, QCheckBox, QLineEdit,
-                            QColorDialog, QStyleFactory, QInputDialog)
+                            QColorDialog, QStyleFactory, QInputDialog,
+                            QDoubleSpinBox, QProgressDialog)
 from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
-from PyQt5.QtCore import QIODevice, QTimer, Qt, QUrl
+from PyQt5.QtCore import QIODevice, QTimer, Qt, QUrl, QPointF, pyqtSignal
 from PyQt5.QtChart import QChart, QChartView, QLineSeries, QValueAxis
 from PyQt5.QtGui import QPainter, QColor, QFont
 from PyQt5.QtMultimedia import QSoundEffect
+from qt_log_view import BufferedLogView
+from weight_rollup import RollupPyramid
+from weight_stats import ScaleStats, SlidingWindow
+from stability import StabilityDetector
+from alerts import AlertManager, OVERLOAD, UNDERLOAD, TARGET
+from weight_recorder import WeightRecorder
+from weight_archive import SegmentArchive, STATUS_STABLE
+from weighing_journal import WeighingJournal, STABLE, TARE, OPERATOR
+from compressed_history import CompressedHistory
+from reading_runs import RunCollapser, REPEAT, NEW
+from weight_export import ExportJob, write_csv, write_xlsx
+from web_server import WeightWebServer
+from weight_board import WeightBoard
+from weight_uploader import WeightUploader
+from app_settings import read_settings, write_settings, widget_value, set_widget_value
+
+SETTINGS_FILE = "ves_web4_settings.json"
 
 class WeightScaleApp(QMainWindow):
+    # Точки из архива, прочитанные в фоновом потоке: (порт, [(время, вес)], ошибка)
+    backfill_ready = pyqtSignal(str, object, object)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Программа для весового прибора МИДЛ МИ ВДА/12Я")
@@ -20,7 +44,55 @@ class WeightScaleApp(QMainWindow):
         
         self.serial = QSerialPort()
         self.weight_history = []
+        # Полная история сеанса (до недели) в сжатом виде - для экспорта.
+        # Время в ней абсолютное (секунды от эпохи): туда попадают и точки архива до запуска
+        self.history = CompressedHistory(max_age=7 * 24 * 3600)
+        # Веса из журнала после сбоя: весы -> [(время, вес)], добавляются к графику при подключении
+        self.recovered_points = {}
+        # Повторы одного и того же показания сворачиваются в серии
+        self.runs = RunCollapser(heartbeat=1.0)
         self.max_history_points = 100
+        self.start_time = time.time()
+        # Агрегаты для длинных интервалов графика (смена/сутки/неделя)
+        self.rollup = RollupPyramid()
+        self.chart_spans = {
+            "Последние точки": None,
+            "10 минут": 600,
+            "1 час": 3600,
+            "Смена (8 ч)": 8 * 3600,
+            "Сутки": 24 * 3600,
+            "Неделя": 7 * 24 * 3600
+        }
+        self.chart_span = None
+        # Интервалы экспорта: от последней точки назад
+        self.export_spans = {
+            "Вся история": None,
+            "10 минут": 600,
+            "1 час": 3600,
+            "Смена (8 ч)": 8 * 3600
+        }
+        self.export_job = None
+        self.export_progress = None
+        self.export_timer = QTimer()
+        self.export_timer.timeout.connect(self.poll_export_job)
+        # Скользящая статистика по весам и окно видимых точек графика
+        self.stats = ScaleStats()
+        self.chart_window = SlidingWindow(max_count=self.max_history_points)
+        # Детектор стабильного веса: целевой вес и запись работают по успокоившимся нагрузкам
+        self.stability = StabilityDetector()
+        self.stability.subscribe(self.on_stable_weight)
+        # Оповещения копятся в очереди и показываются без модальных окон
+        self.alerts = AlertManager()
+        # Все отсчеты и стабильные взвешивания пишутся в SQLite в фоне
+        self.recorder = WeightRecorder("weights.db")
+        # Журнал операций взвешивания: fsync группами, восстановление после сбоя
+        self.journal = WeighingJournal(os.path.join("journal", "weighings.jnl"))
+        # Долговременный колоночный архив по суткам; из него же подгружается история графика
+        self.archive = SegmentArchive("archive")
+        self.archive_backfill_span = 8 * 3600
+        # Пока архив читается в фоне, новые точки для графика копятся здесь
+        self.backfill_live = None
+        self.backfill_ready.connect(self.apply_backfill)
         self.current_unit = 'kg'
         self.units = {'kg': 1.0, 'g': 1000.0, 'lb': 2.20462}
         self.protocols = [
@@ -38,10 +110,24 @@ class WeightScaleApp(QMainWindow):
         self.sound_effect = QSoundEffect()
         self.sound_effect.setSource(QUrl.fromLocalFile("beep.wav"))
         
+        # Настройки читаются до построения интерфейса: последний рабочий порт
+        # и определенный протокол нужны сразу, чтобы подключиться без ожидания
+        self.settings = read_settings(SETTINGS_FILE, {"auto_connect": True})
+        self.cached_protocol = self.settings.get("cached_protocol")
+        self.last_good_port = self.settings.get("last_good_port")
+        
         self.init_ui()
         self.init_serial_settings()
         self.init_chart()
         self.load_settings()
+        self.start_uploader()
+        self.replay_journal()
+        self.start_web_server()
+        self.start_weight_board()
+        
+        self.alert_timer = QTimer()
+        self.alert_timer.timeout.connect(self.process_alerts)
+        self.alert_timer.start(100)
         
     def init_ui(self):
         # Главный виджет и табы
@@ -109,6 +195,14 @@ class WeightScaleApp(QMainWindow):
         status_layout.addWidget(self.settings_label)
         status_group.setLayout(status_layout)
         
+        # Баннер оповещений (немодальный, скрывается сам)
+        self.alert_banner = QLabel()
+        self.alert_banner.setAlignment(Qt.AlignCenter)
+        self.alert_banner.setVisible(False)
+        self.alert_banner_timer = QTimer()
+        self.alert_banner_timer.setSingleShot(True)
+        self.alert_banner_timer.timeout.connect(lambda: self.alert_banner.setVisible(False))
+        
         # Группа веса
         weight_group = QGroupBox("Измерения")
         weight_layout = QVBoxLayout()
@@ -116,6 +210,9 @@ class WeightScaleApp(QMainWindow):
         self.weight_label = QLabel("Вес: ---")
         self.weight_label.setStyleSheet("font-size: 32px; font-weight: bold;")
         
+        self.stats_label = QLabel("Статистика: ---")
+        self.stable_label = QLabel("Стабильность: ---")
+        
         self.unit_combo = QComboBox()
         self.unit_combo.addItems(self.units.keys())
         self.unit_combo.currentTextChanged.connect(self.change_unit)
@@ -135,6 +232,8 @@ class WeightScaleApp(QMainWindow):
         target_layout.addWidget(self.clear_target_button)
         
         weight_layout.addWidget(self.weight_label)
+        weight_layout.addWidget(self.stats_label)
+        weight_layout.addWidget(self.stable_label)
         weight_layout.addWidget(self.unit_combo)
         weight_layout.addLayout(target_layout)
         weight_group.setLayout(weight_layout)
@@ -163,8 +262,8 @@ class WeightScaleApp(QMainWindow):
         log_group = QGroupBox("Лог")
         log_layout = QVBoxLayout()
         
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
+        # Ограниченный лог с пакетным добавлением строк
+        self.log_text = BufferedLogView(max_lines=5000)
         
         self.save_log_button = QPushButton("Сохранить лог в файл")
         self.save_log_button.clicked.connect(self.save_log_to_file)
@@ -174,6 +273,7 @@ class WeightScaleApp(QMainWindow):
         log_group.setLayout(log_layout)
         
         # Добавление всех групп на вкладку
+        layout.addWidget(self.alert_banner)
         layout.addWidget(status_group)
         layout.addWidget(weight_group)
         layout.addWidget(control_group)
@@ -184,6 +284,8 @@ class WeightScaleApp(QMainWindow):
         # Таймер для периодического опроса весов
         self.timer = QTimer()
         self.timer.timeout.connect(self.read_data)
+        # Данные читаются сразу по приходу, таймер остается как подстраховка
+        self.serial.readyRead.connect(self.read_data)
         self.timer.setInterval(500)
     
     def init_settings_tab(self):
@@ -248,6 +350,63 @@ class WeightScaleApp(QMainWindow):
         chart_layout.addWidget(self.history_points_spin)
         chart_group.setLayout(chart_layout)
         
+        # Настройки стабилизации
+        stability_group = QGroupBox("Стабилизация веса")
+        stability_layout = QVBoxLayout()
+        
+        self.stable_std_spin = QDoubleSpinBox()
+        self.stable_std_spin.setDecimals(4)
+        self.stable_std_spin.setRange(0.0001, 10.0)
+        self.stable_std_spin.setSingleStep(0.001)
+        self.stable_std_spin.setValue(self.stability.max_std)
+        self.stable_std_spin.valueChanged.connect(
+            lambda value: self.stability.configure(max_std=value))
+        
+        self.settle_time_spin = QDoubleSpinBox()
+        self.settle_time_spin.setRange(0.0, 30.0)
+        self.settle_time_spin.setSingleStep(0.5)
+        self.settle_time_spin.setValue(self.stability.settle_time)
+        self.settle_time_spin.valueChanged.connect(
+            lambda value: self.stability.configure(settle_time=value))
+        
+        stability_layout.addWidget(QLabel("Допустимое СКО (кг):"))
+        stability_layout.addWidget(self.stable_std_spin)
+        stability_layout.addWidget(QLabel("Время успокоения (с):"))
+        stability_layout.addWidget(self.settle_time_spin)
+        stability_group.setLayout(stability_layout)
+        
+        # Настройки оповещений
+        alert_group = QGroupBox("Оповещения")
+        alert_layout = QVBoxLayout()
+        
+        self.overload_spin = QDoubleSpinBox()
+        self.overload_spin.setDecimals(3)
+        self.overload_spin.setRange(0.0, 100000.0)
+        self.overload_spin.setSpecialValueText("Выключено")
+        self.overload_spin.valueChanged.connect(self.update_alert_limits)
+        
+        self.underload_spin = QDoubleSpinBox()
+        self.underload_spin.setDecimals(3)
+        self.underload_spin.setRange(0.0, 100000.0)
+        self.underload_spin.setSpecialValueText("Выключено")
+        self.underload_spin.valueChanged.connect(self.update_alert_limits)
+        
+        self.hysteresis_spin = QDoubleSpinBox()
+        self.hysteresis_spin.setDecimals(3)
+        self.hysteresis_spin.setRange(0.0, 1000.0)
+        self.hysteresis_spin.setSingleStep(0.005)
+        self.hysteresis_spin.setValue(self.alerts.hysteresis)
+        self.hysteresis_spin.valueChanged.connect(
+            lambda value: setattr(self.alerts, 'hysteresis', value))
+        
+        alert_layout.addWidget(QLabel("Порог перегруза (кг):"))
+        alert_layout.addWidget(self.overload_spin)
+        alert_layout.addWidget(QLabel("Порог недогруза (кг):"))
+        alert_layout.addWidget(self.underload_spin)
+        alert_layout.addWidget(QLabel("Гистерезис (кг):"))
+        alert_layout.addWidget(self.hysteresis_spin)
+        alert_group.setLayout(alert_layout)
+        
         # Настройки звука
         sound_group = QGroupBox("Настройки звука")
         sound_layout = QVBoxLayout()
@@ -265,6 +424,8 @@ class WeightScaleApp(QMainWindow):
         # Добавление групп на вкладку
         layout.addWidget(port_group)
         layout.addWidget(chart_group)
+        layout.addWidget(stability_group)
+        layout.addWidget(alert_group)
         layout.addWidget(sound_group)
         layout.addStretch()
         
@@ -277,6 +438,15 @@ class WeightScaleApp(QMainWindow):
         self.chart_view = QChartView()
         self.chart_view.setRenderHint(QPainter.Antialiasing)
         
+        # Выбор интервала отображения
+        span_layout = QHBoxLayout()
+        self.chart_span_combo = QComboBox()
+        self.chart_span_combo.addItems(self.chart_spans.keys())
+        self.chart_span_combo.currentTextChanged.connect(self.change_chart_span)
+        span_layout.addWidget(QLabel("Интервал:"))
+        span_layout.addWidget(self.chart_span_combo)
+        span_layout.addStretch()
+        
         # Кнопки экспорта
         export_layout = QHBoxLayout()
         self.export_csv_button = QPushButton("Экспорт в CSV")
@@ -284,9 +454,15 @@ class WeightScaleApp(QMainWindow):
         self.export_excel_button = QPushButton("Экспорт в Excel")
         self.export_excel_button.clicked.connect(lambda: self.export_data('excel'))
         
+        self.export_span_combo = QComboBox()
+        self.export_span_combo.addItems(self.export_spans.keys())
+        
+        export_layout.addWidget(QLabel("Экспорт:"))
+        export_layout.addWidget(self.export_span_combo)
         export_layout.addWidget(self.export_csv_button)
         export_layout.addWidget(self.export_excel_button)
         
+        layout.addLayout(span_layout)
         layout.addWidget(self.chart_view)
         layout.addLayout(export_layout)
         self.chart_tab.setLayout(layout)
@@ -420,6 +596,7 @@ class WeightScaleApp(QMainWindow):
     
     def update_history_size(self, size):
         self.max_history_points = size
+        self.chart_window.set_limits(max_count=size)
         if len(self.weight_history) > size:
             self.weight_history = self.weight_history[-size:]
             self.update_chart()
@@ -428,6 +605,8 @@ class WeightScaleApp(QMainWindow):
         if self.serial.isOpen():
             self.serial.close()
             self.timer.stop()
+            self.archive.flush()
+            self.runs.reset()
             self.connect_button.setText("Подключить")
             self.status_label.setText("Статус: Не подключено")
             self.zero_button.setEnabled(False)
@@ -454,9 +633,10 @@ class WeightScaleApp(QMainWindow):
                 self.timer.start()
                 self.log_message(f"Подключено к {port_name}")
                 self.log_message(f"Параметры: {self.settings_label.text()}")
+                self.backfill_history(port_name)
                 
-                # Попытка автоопределения протокола
-                if self.protocol_combo.currentText() == "Auto":
+                # Попытка автоопределения протокола, если он еще не известен
+                if self.protocol_combo.currentText() == "Auto" and self.current_protocol is None:
                     self.detect_protocol()
             else:
                 QMessageBox.critical(self, "Ошибка", "Не удалось открыть порт!")
@@ -520,7 +700,7 @@ class WeightScaleApp(QMainWindow):
         self.settings_label.setText(settings_text)
     
     def read_data(self):
-        if self.serial.isOpen() and self.serial.canReadLine():
+        while self.serial.isOpen() and self.serial.canReadLine():
             data = self.serial.readLine().data().decode().strip()
             self.process_weight_data(data)
     
@@ -592,48 +772,285 @@ class WeightScaleApp(QMainWindow):
             self.log_message(f"Ошибка обработки данных: {str(e)}")
     
     def process_weight_value(self, weight_kg, unit, raw_data):
+        now = time.time()
+        if self.last_good_port != self.serial.portName():
+            # Порт дал первый вес - запоминаем его для подключения при следующем запуске
+            self.last_good_port = self.serial.portName()
+            self.save_settings()
+        run_state = self.runs.add(now, weight_kg)
+        
+        # Целевой вес проверяется в on_stable_weight по событию стабилизации.
+        # Детектор получает и повторы: ему важно, сколько времени вес не меняется
+        self.stability.add(now, weight_kg)
+        self.update_stable_label()
+        
+        if self.weight_board is not None:
+            # Табло в общей памяти получает каждый отсчет: читателям важна свежесть времени
+            self.weight_board.publish(self.serial.portName(), now, weight_kg,
+                                      STATUS_STABLE if self.stability.stable else 0)
+        
+        # Повтор прежнего показания: интерфейс, график и лог не трогаем.
+        # Раз в секунду повтор все же проходит дальше, чтобы история покрывала время
+        if run_state == REPEAT:
+            return
+        
         # Конвертация в выбранную единицу измерения
         converted_weight = weight_kg * self.units[self.current_unit]
         
         self.weight_label.setText(f"Вес: {converted_weight:.3f} {self.current_unit}")
         
-        # Проверка на достижение целевого веса
-        if self.target_weight is not None and abs(weight_kg - self.target_weight) < 0.001:
-            self.notify_target_weight_reached()
-        
-        # Добавление в историю для графика
-        timestamp = len(self.weight_history) * 0.5  # Предполагаем интервал 0.5 сек
-        self.weight_history.append((timestamp, weight_kg))
+        # Добавление в историю для графика; пока идет подгрузка архива -
+        # после нее, чтобы история оставалась упорядоченной по времени
+        if self.backfill_live is not None:
+            self.backfill_live.append((now, weight_kg))
+        else:
+            self.weight_history.append((now - self.start_time, weight_kg))
+            self.history.append(now, weight_kg)
+            self.rollup.add(now, weight_kg)
+            self.chart_window.add(now, weight_kg)
+        self.stats.add(now, weight_kg)
+        self.update_stats_label()
+        self.alerts.check_limits(now, weight_kg)
+        
+        self.recorder.add_sample(self.serial.portName(), now, weight_kg, self.stability.stable)
+        if self.web_server is not None:
+            self.web_server.publish(self.serial.portName(), now, weight_kg, self.stability.stable)
+        if self.uploader is not None and self.settings.get("upload_samples", True):
+            self.uploader.add_sample(self.serial.portName(), now, weight_kg, self.stability.stable)
+        self.archive.append(self.serial.portName(), now, weight_kg,
+                            STATUS_STABLE if self.stability.stable else 0)
         
         if len(self.weight_history) > self.max_history_points:
             self.weight_history.pop(0)
         
         self.update_chart()
         
-        self.log_message(f"Получены данные: {raw_data}")
+        if run_state == NEW:
+            last_run = self.runs.last_run
+            if last_run is not None and last_run.count > 1:
+                self.log_message(f"Получены данные: {raw_data} "
+                                 f"(прежнее показание {last_run.count} раз за "
+                                 f"{last_run.end - last_run.start:.1f} с)")
+            else:
+                self.log_message(f"Получены данные: {raw_data}")
+    
+    def update_stable_label(self):
+        text = "Стабильность: " + ("Стабильно" if self.stability.stable else "Нестабильно")
+        if self.stable_label.text() != text:
+            self.stable_label.setText(text)
+    
+    def change_chart_span(self, span_name):
+        self.chart_span = self.chart_spans.get(span_name)
+        self.update_chart()
+    
+    def backfill_history(self, port_name):
+        # Подгрузка истории из архива, если в этом сеансе данных еще нет.
+        # Архив большой - читаем его в фоновом потоке, чтобы окно не замирало при подключении
+        if self.rollup.last_timestamp is not None or self.backfill_live is not None:
+            return
+        
+        self.backfill_live = []
+        time_to = time.time()
+        # Буферы архива сбрасываются здесь, в потоке записи; фоновый поток только читает файлы
+        self.archive.flush()
+        recovered = self.recovered_points.pop(port_name, [])
+        threading.Thread(target=self.read_backfill, name="archive-backfill", daemon=True,
+                         args=(port_name, time_to - self.archive_backfill_span, time_to,
+                               recovered)).start()
+    
+    def read_backfill(self, port_name, time_from, time_to, recovered):
+        points = []
+        error = None
+        try:
+            points = [(timestamp, weight_kg) for timestamp, weight_kg, _
+                      in self.archive.samples(port_name, time_from, time_to, flush=False)]
+        except (OSError, ValueError) as e:
+            error = e
+        
+        # Хвост архива мог не записаться при сбое - добавляем стабильные веса из журнала
+        last_timestamp = points[-1][0] if points else time_from
+        for timestamp, weight_kg in recovered:
+            if last_timestamp < timestamp <= time_to:
+                points.append((timestamp, weight_kg))
+                last_timestamp = timestamp
+        self.backfill_ready.emit(port_name, points, error)
+    
+    def apply_backfill(self, port_name, points, error):
+        live = self.backfill_live or []
+        self.backfill_live = None
+        if error is not None:
+            self.log_message(f"Ошибка чтения архива: {str(error)}")
+        
+        for timestamp, weight_kg in points + live:
+            self.backfill_point(timestamp, weight_kg)
+        
+        del self.weight_history[:-self.max_history_points]
+        for timestamp, weight_kg in self.weight_history:
+            self.chart_window.add(timestamp + self.start_time, weight_kg)
+        
+        if points:
+            self.log_message(f"Из архива и журнала загружено точек: {len(points)}")
+        self.update_chart()
+    
+    def backfill_point(self, timestamp, weight_kg):
+        self.rollup.add(timestamp, weight_kg)
+        self.weight_history.append((timestamp - self.start_time, weight_kg))
+        self.history.append(timestamp, weight_kg)
+        if len(self.weight_history) > 2 * self.max_history_points:
+            del self.weight_history[:-self.max_history_points]
     
     def update_chart(self):
-        self.series.clear()
+        if self.chart_span is None:
+            points = self.weight_history
+        else:
+            # Для длинных интервалов берем агрегаты подходящего разрешения
+            _, rows = self.rollup.window(self.chart_span)
+            points = [(row.start - self.start_time, row.mean) for row in rows]
         
-        if not self.weight_history:
+        if not points:
+            self.series.clear()
             return
             
-        min_x = self.weight_history[0][0]
-        max_x = self.weight_history[-1][0]
-        min_y = min(w[1] for w in self.weight_history)
-        max_y = max(w[1] for w in self.weight_history)
+        min_x = points[0][0]
+        max_x = points[-1][0]
+        if self.chart_span is None:
+            min_y = self.chart_window.min
+            max_y = self.chart_window.max
+        else:
+            min_y = min(row.min for row in rows)
+            max_y = max(row.max for row in rows)
         
         # Добавляем небольшой зазор по Y для лучшего отображения
         y_gap = (max_y - min_y) * 0.1 if max_y != min_y else 1.0
         min_y = max(0, min_y - y_gap)
         max_y = max_y + y_gap
         
-        for x, y in self.weight_history:
-            self.series.append(x, y)
+        # replace() перерисовывает серию один раз вместо append по точке
+        self.series.replace([QPointF(x, y) for x, y in points])
         
         self.axisX.setRange(min_x, max_x)
         self.axisY.setRange(min_y, max_y)
     
+    def on_stable_weight(self, event):
+        self.log_message(
+            f"Стабильный вес: {event.weight:.3f} кг (успокоение {event.settle_time:.1f} с)"
+        )
+        
+        self.journal_event(STABLE, event.timestamp, event.weight, std=event.std)
+        if self.web_server is not None:
+            self.web_server.publish(self.serial.portName(), event.timestamp, event.weight, True)
+            self.web_server.publish_event(self.serial.portName(), event.timestamp, event.weight,
+                                          std=event.std, settle_time=event.settle_time)
+        
+        # Проверка на достижение целевого веса
+        self.alerts.check_target(event.timestamp, event.weight)
+    
+    def start_web_server(self):
+        # Веб-страница и WebSocket с живым весом для табло и планшетов.
+        # Без авторизации, поэтому включается только в настройках (web_enabled) и по умолчанию
+        # слушает только этот компьютер; для табло в сети нужно явно задать web_host
+        self.web_server = None
+        if not self.settings.get("web_enabled", False):
+            return
+        host = self.settings.get("web_host", "127.0.0.1")
+        port = self.settings.get("web_port", 8765)
+        try:
+            self.web_server = WeightWebServer(host, port, history=self.web_history).start()
+            self.log_message(f"Веб-сервер запущен: http://{host}:{port}/")
+        except OSError as e:
+            self.log_message(f"Не удалось запустить веб-сервер на порту {port}: {str(e)}")
+    
+    def start_uploader(self):
+        # Выгрузка на центральный сервер, если в настройках указан upload_url
+        self.uploader = None
+        url = self.settings.get("upload_url")
+        if not url:
+            return
+        try:
+            # Путь очереди - рядом с программой, а не в текущем каталоге
+            path = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])),
+                                self.settings.get("upload_queue", "upload_queue.db"))
+            self.uploader = WeightUploader(url, path, terminal=self.settings.get("terminal_id"),
+                                           token=self.settings.get("upload_token"))
+            self.log_message(f"Выгрузка на сервер: {url}, в очереди: {self.uploader.pending()}")
+        except sqlite3.Error as e:
+            self.log_message(f"Не удалось открыть очередь выгрузки: {str(e)}")
+    
+    def start_weight_board(self):
+        # Последний вес в общей памяти для локальных процессов (печать этикеток, камера)
+        self.weight_board = None
+        if not self.settings.get("shared_board", True):
+            return
+        try:
+            self.weight_board = WeightBoard(self.settings.get("shared_board_name", "ves_weight_board"))
+            self.log_message(f"Табло в общей памяти: {self.weight_board.name}")
+        except OSError as e:
+            self.log_message(f"Не удалось создать табло в общей памяти: {str(e)}")
+    
+    def web_history(self, scale, time_from, time_to):
+        # Вызывается из потока веб-сервера: snapshot копирует открытый блок,
+        # дальше чтение идет без участия потока интерфейса.
+        # В памяти история текущих весов
+        if scale != self.last_good_port:
+            return
+        yield from self.history.snapshot(time_from, time_to)
+    
+    def journal_event(self, kind, timestamp=None, weight=None, **data):
+        # Сначала журнал, затем база. Номер записи журнала хранится в базе,
+        # поэтому повторное воспроизведение журнала не создает дублей
+        port = self.serial.portName()
+        timestamp = timestamp if timestamp is not None else time.time()
+        seq = self.journal.append(kind, timestamp, scale=port, weight=weight, **data)
+        self.persist_journal_record(port, timestamp, kind, weight, data, seq)
+        if weight is not None:
+            if self.uploader is not None:
+                self.uploader.add_weighing(port, timestamp, weight, kind=kind, seq=seq, **data)
+    
+    def persist_journal_record(self, scale, timestamp, kind, weight, data, seq):
+        # Взвешивания - в таблицу weighings, операции без веса (тара, калибровка,
+        # целевой вес) - в events; иначе после сжатия журнала они бы пропали
+        if weight is not None:
+            self.recorder.add_weighing(scale, timestamp, weight, kind=kind,
+                                       std=data.get("std"), note=data.get("note"), seq=seq)
+        else:
+            self.recorder.add_event(scale, timestamp, kind, data, seq=seq)
+    
+    def replay_journal(self):
+        # Операции, которые могли не дойти до базы перед сбоем питания
+        records = self.journal.recovered
+        if not records:
+            return
+        
+        for record in records:
+            data = dict(record.data)
+            scale = data.pop("scale", "")
+            weight = data.pop("weight", None)
+            self.persist_journal_record(scale, record.timestamp, record.kind, weight, data, record.seq)
+            if weight is not None:
+                # Стабильные веса, которые не успели попасть в архив, - для графика и истории
+                self.recovered_points.setdefault(scale, []).append((record.timestamp, weight))
+                # Могли и не успеть попасть в очередь выгрузки. Уже поставленные номера
+                # очередь пропускает, а повтор после потери очереди сервер узнает по uid
+                if self.uploader is not None:
+                    self.uploader.add_weighing(scale, record.timestamp, weight,
+                                               kind=record.kind, seq=record.seq, **data)
+        
+        # Журнал очищается только после того, как база надежно записана на диск
+        if self.recorder.sync() and self.recorder.error is None:
+            self.journal.compact(records[-1].seq)
+        self.log_message(f"Из журнала восстановлено операций: {len(records)}")
+    
+    def update_stats_label(self):
+        window = self.stats["10 с"]
+        factor = self.units[self.current_unit]
+        self.stats_label.setText(
+            f"За 10 с: среднее {window.mean * factor:.3f}, "
+            f"σ {window.std * factor:.3f}, "
+            f"мин {window.min * factor:.3f}, "
+            f"макс {window.max * factor:.3f}, "
+            f"скорость {window.slope * factor:+.3f} {self.current_unit}/с"
+        )
+    
     def send_zero_command(self):
         if self.current_protocol == "MIDL-MI-VDA":
             command = "Z\r\n"
@@ -655,6 +1072,8 @@ class WeightScaleApp(QMainWindow):
         if self.serial.isOpen():
             self.serial.write(command.encode())
             self.log_message(f"Отправлена команда тары: {command.strip()}")
+            run = self.runs.current_run
+            self.journal_event(TARE, weight=run.value if run is not None else None)
     
     def start_calibration(self):
         weight, ok = QInputDialog.getDouble(
@@ -690,6 +1109,7 @@ class WeightScaleApp(QMainWindow):
                 
                 self.serial.write(command.encode())
                 self.log_message(f"Начата процедура калибровки с весом {weight} кг")
+                self.journal_event(OPERATOR, note=f"Калибровка {weight} кг")
     
     def change_unit(self, unit):
         self.current_unit = unit
@@ -699,24 +1119,48 @@ class WeightScaleApp(QMainWindow):
         try:
             weight = float(self.target_weight_edit.text())
             self.target_weight = weight
+            self.alerts.set_target(weight)
             self.log_message(f"Установлен целевой вес: {weight} кг")
+            self.journal_event(OPERATOR, note=f"Целевой вес {weight} кг")
         except ValueError:
             QMessageBox.warning(self, "Ошибка", "Введите корректное значение веса")
     
     def clear_target_weight(self):
         self.target_weight = None
+        self.alerts.set_target(None)
         self.target_weight_edit.clear()
         self.log_message("Целевой вес сброшен")
+        self.journal_event(OPERATOR, note="Целевой вес сброшен")
     
-    def notify_target_weight_reached(self):
-        if self.sound_checkbox.isChecked():
-            self.play_sound()
-        
-        QMessageBox.information(
-            self, "Целевой вес достигнут", 
-            f"Достигнут целевой вес: {self.target_weight} кг"
+    def update_alert_limits(self):
+        # Нулевое значение означает, что порог выключен
+        overload = self.overload_spin.value() or None
+        underload = self.underload_spin.value() or None
+        self.alerts.set_limits(overload, underload)
+    
+    def process_alerts(self):
+        for event in self.alerts.pop_events():
+            if not event.active:
+                continue
+            self.log_message(event.message)
+            if event.kind == TARGET:
+                self.journal_event(TARGET, event.timestamp, event.weight)
+            self.show_alert_banner(event)
+            if self.sound_checkbox.isChecked():
+                self.play_sound()
+    
+    def show_alert_banner(self, event):
+        if event.kind in (OVERLOAD, UNDERLOAD):
+            color = "#c0392b"
+        else:
+            color = "#27ae60"
+        self.alert_banner.setStyleSheet(
+            f"background-color: {color}; color: white; font-size: 18px; "
+            f"font-weight: bold; padding: 6px;"
         )
-        self.clear_target_weight()
+        self.alert_banner.setText(event.message)
+        self.alert_banner.setVisible(True)
+        self.alert_banner_timer.start(5000)
     
     def play_sound(self):
         if not self.sound_effect.isPlaying():
@@ -736,7 +1180,7 @@ class WeightScaleApp(QMainWindow):
                 QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить файл: {str(e)}")
     
     def export_data(self, format=None):
-        if not self.weight_history:
+        if not self.history:
             QMessageBox.warning(self, "Ошибка", "Нет данных для экспорта")
             return
         
@@ -769,22 +1213,61 @@ class WeightScaleApp(QMainWindow):
                 return
         
         try:
+            # Экспорт идет в фоне, результат сообщает poll_export_job
             if format == 'csv':
                 self.export_to_csv(file_name)
             elif format == 'excel':
                 self.export_to_excel(file_name)
-            
-            self.log_message(f"Данные экспортированы в {file_name}")
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать данные: {str(e)}")
     
+    def export_time_range(self):
+        span = self.export_spans[self.export_span_combo.currentText()]
+        if span is None or not self.history:
+            return None, None
+        return self.history.last_time - span, None
+    
     def export_to_csv(self, file_name):
-        with open(file_name, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Время (с)", "Вес (kg)"])
-            
-            for time, weight in self.weight_history:
-                writer.writerow([time, weight])
+        time_from, time_to = self.export_time_range()
+        self.start_export_job(ExportJob.from_snapshot(
+            file_name, write_csv, self.history.snapshot(time_from, time_to), wall_clock=True))
+    
+    def start_export_job(self, job):
+        if self.export_job is not None and not self.export_job.finished.is_set():
+            QMessageBox.warning(self, "Ошибка", "Предыдущий экспорт еще не завершен")
+            return
+        
+        self.export_job = job
+        self.export_progress = QProgressDialog(
+            f"Экспорт в {job.file_name}...", "Отмена", 0, 1000, self)
+        self.export_progress.setWindowTitle("Экспорт данных")
+        self.export_progress.setWindowModality(Qt.NonModal)
+        self.export_progress.setMinimumDuration(500)
+        self.export_progress.canceled.connect(job.cancel)
+        job.start()
+        self.export_timer.start(100)
+    
+    def poll_export_job(self):
+        job = self.export_job
+        if job is None:
+            self.export_timer.stop()
+            return
+        
+        if not job.finished.is_set():
+            self.export_progress.setValue(int(job.progress * 999))
+            return
+        
+        self.export_timer.stop()
+        self.export_progress.canceled.disconnect(job.cancel)
+        self.export_progress.setValue(1000)
+        self.export_job = None
+        
+        if job.error is not None:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось экспортировать данные: {str(job.error)}")
+        elif job.cancelled:
+            self.log_message(f"Экспорт в {job.file_name} отменен")
+        else:
+            self.log_message(f"Данные экспортированы в {job.file_name} ({job.done} строк)")
     
     def export_to_excel(self, file_name):
         try:
@@ -796,21 +1279,23 @@ class WeightScaleApp(QMainWindow):
             )
             return
         
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Данные весов"
-        
-        # Заголовки
-        ws.append(["Время (с)", "Вес (kg)"])
-        
-        # Данные
-        for time, weight in self.weight_history:
-            ws.append([time, weight])
-        
-        # Сохранение
-        wb.save(file_name)
+        # Текущая скользящая статистика
+        stats_rows = [["Окно", "Точек", "Среднее", "СКО", "Мин", "Макс", "Скорость (kg/с)"]]
+        for name, values in self.stats.snapshot().items():
+            stats_rows.append([
+                name, values["count"], values["mean"], values["std"],
+                values["min"], values["max"], values["slope"]
+            ])
+        
+        # Данные пишутся потоково на листы "Данные весов", "Данные весов (2)", ...
+        time_from, time_to = self.export_time_range()
+        self.start_export_job(ExportJob.from_snapshot(
+            file_name, write_xlsx, self.history.snapshot(time_from, time_to), wall_clock=True,
+            extra_sheets={"Статистика": stats_rows}))
     
     def change_protocol(self, protocol):
+        if protocol != "Auto":
+            self.cached_protocol = protocol
         if protocol == "Auto":
             self.current_protocol = None
             self.protocol_info.setText("Режим автоопределения протокола. Программа будет пытаться автоматически определить формат данных.")
@@ -974,21 +1459,80 @@ class WeightScaleApp(QMainWindow):
         app.setStyle(QStyleFactory.create(theme_name))
         self.log_message(f"Установлена тема: {theme_name}")
     
+    def settings_widgets(self):
+        return {
+            "baud_rate": self.baud_combo,
+            "data_bits": self.data_bits_combo,
+            "parity": self.parity_combo,
+            "stop_bits": self.stop_bits_combo,
+            "flow_control": self.flow_control_combo,
+            "protocol": self.protocol_combo,
+            "unit": self.unit_combo,
+            "history_points": self.history_points_spin,
+            "stable_std": self.stable_std_spin,
+            "settle_time": self.settle_time_spin,
+            "overload": self.overload_spin,
+            "underload": self.underload_spin,
+            "hysteresis": self.hysteresis_spin,
+            "sound": self.sound_checkbox,
+            "chart_span": self.chart_span_combo,
+            "font_size": self.font_size_spin,
+            "font_family": self.font_family_combo,
+        }
+    
     def load_settings(self):
-        # Здесь можно реализовать загрузку настроек из файла
-        pass
+        for key, widget in self.settings_widgets().items():
+            if key in self.settings:
+                set_widget_value(widget, self.settings[key])
+        
+        # В режиме Auto сразу используем протокол, определенный в прошлый раз
+        if self.protocol_combo.currentText() == "Auto" and self.cached_protocol in self.protocols[1:]:
+            self.change_protocol(self.cached_protocol)
+            self.log_message(f"Использован сохраненный протокол: {self.cached_protocol}")
+        
+        # Переподключение к последнему порту, с которого приходил вес
+        if self.settings.get("auto_connect") and self.last_good_port:
+            if self.port_combo.findText(self.last_good_port) >= 0:
+                self.port_combo.setCurrentText(self.last_good_port)
+                QTimer.singleShot(0, self.toggle_connection)
     
     def save_settings(self):
-        # Здесь можно реализовать сохранение настроек в файл
-        pass
+        settings = dict(self.settings)
+        for key, widget in self.settings_widgets().items():
+            settings[key] = widget_value(widget)
+        settings["port"] = self.port_combo.currentText()
+        settings["cached_protocol"] = self.cached_protocol
+        settings["last_good_port"] = self.last_good_port
+        try:
+            write_settings(SETTINGS_FILE, settings)
+            self.settings = settings
+        except OSError as e:
+            self.log_message(f"Ошибка сохранения настроек: {str(e)}")
     
     def log_message(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.append(f"[{timestamp}] {message}")
+        self.log_text.append_line(f"[{timestamp}] {message}")
     
     def closeEvent(self, event):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job.finished.wait(2)
         if self.serial.isOpen():
             self.serial.close()
+        if self.web_server is not None:
+            self.web_server.stop()
+        # Штатное завершение: все операции журнала уже в базе и в очереди выгрузки,
+        # журнал можно очистить, чтобы при следующем запуске не воспроизводить их заново
+        uploaded = self.uploader is None or self.uploader.flush()
+        if uploaded and self.recorder.sync() and self.recorder.error is None:
+            self.journal.compact(self.journal.next_seq - 1)
+        self.journal.close()
+        self.recorder.close()
+        self.archive.close()
+        if self.weight_board is not None:
+            self.weight_board.close()
+        if self.uploader is not None:
+            self.uploader.close(timeout=5)
         self.save_settings()
         event.accept()
 
@@ -0,0 +1,81 @@
+from collections import deque, namedtuple
+
+TARGET = "target"
+OVERLOAD = "overload"
+UNDERLOAD = "underload"
+
+ALERT_TITLES = {
+    TARGET: "Целевой вес",
+    OVERLOAD: "Перегруз",
+    UNDERLOAD: "Недогруз",
+}
+
+# active=True - вход в зону оповещения, False - выход из нее
+AlertEvent = namedtuple("AlertEvent", "timestamp kind active weight message")
+
+
+class AlertManager:
+    # Оповещения с гистерезисом: событие возникает при входе в зону (enter)
+    # и повторно не возникает, пока вес не выйдет за границу выхода (exit).
+    # События складываются в очередь и забираются интерфейсом по таймеру,
+    # поэтому проверка никогда не блокирует прием данных.
+    def __init__(self, target_band=0.001, hysteresis=0.005, max_events=100):
+        self.target_weight = None
+        self.overload_limit = None
+        self.underload_limit = None
+        self.target_band = target_band
+        self.hysteresis = hysteresis
+        self.events = deque(maxlen=max_events)
+        self.active = set()
+
+    def set_target(self, weight):
+        self.target_weight = weight
+        self.active.discard(TARGET)
+
+    def set_limits(self, overload=None, underload=None):
+        self.overload_limit = overload
+        self.underload_limit = underload
+        self.active.discard(OVERLOAD)
+        self.active.discard(UNDERLOAD)
+
+    def check_target(self, timestamp, weight):
+        if self.target_weight is None:
+            return
+        deviation = abs(weight - self.target_weight)
+        self._update(
+            TARGET, timestamp, weight,
+            deviation <= self.target_band,
+            deviation > self.target_band + self.hysteresis,
+            f"Достигнут целевой вес: {self.target_weight} кг"
+        )
+
+    def check_limits(self, timestamp, weight):
+        if self.overload_limit is not None:
+            self._update(
+                OVERLOAD, timestamp, weight,
+                weight >= self.overload_limit,
+                weight < self.overload_limit - self.hysteresis,
+                f"Перегруз: {weight:.3f} кг (предел {self.overload_limit} кг)"
+            )
+        if self.underload_limit is not None:
+            self._update(
+                UNDERLOAD, timestamp, weight,
+                weight <= self.underload_limit,
+                weight > self.underload_limit + self.hysteresis,
+                f"Недогруз: {weight:.3f} кг (предел {self.underload_limit} кг)"
+            )
+
+    def _update(self, kind, timestamp, weight, entered, exited, message):
+        if kind not in self.active:
+            if entered:
+                self.active.add(kind)
+                self.events.append(AlertEvent(timestamp, kind, True, weight, message))
+        elif exited:
+            self.active.discard(kind)
+            self.events.append(AlertEvent(timestamp, kind, False, weight, message))
+
+    def pop_events(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
@@ -0,0 +1,48 @@
+import json
+import os
+
+
+def read_settings(path, defaults=None):
+    # Отсутствующий или испорченный файл не мешает запуску - берутся значения по умолчанию
+    settings = dict(defaults or {})
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            settings.update(data)
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения настроек {path}: {str(e)}")
+    return settings
+
+
+def write_settings(path, settings):
+    # Сначала во временный файл, затем атомарная замена:
+    # при сбое во время записи остается прежний файл настроек
+    temp = path + ".tmp"
+    with open(temp, 'w', encoding='utf-8') as f:
+        json.dump(settings, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def widget_value(widget):
+    if hasattr(widget, 'isChecked'):
+        return widget.isChecked()
+    if hasattr(widget, 'currentText'):
+        return widget.currentText()
+    return widget.value()
+
+
+def set_widget_value(widget, value):
+    if hasattr(widget, 'setChecked'):
+        widget.setChecked(bool(value))
+    elif hasattr(widget, 'findText'):
+        # Значения, которых больше нет в списке (например, порт), пропускаем
+        index = widget.findText(str(value))
+        if index >= 0:
+            widget.setCurrentIndex(index)
+    else:
+        widget.setValue(value)
@@ -0,0 +1,192 @@
+import bisect
+from array import array
+from collections import deque
+
+# Сжатая история отсчетов в памяти.
+# Время хранится в миллисекундах, вес - в дискретах (целое число единиц последнего знака).
+# Закрытый блок: первое время и показание как есть, затем для каждой следующей точки
+# дельта-от-дельты времени и дельта показания в zigzag-varint. При равномерном опросе
+# и стоящем весе обе величины равны нулю и занимают по байту - около 2 байт на отсчет
+# вместо ~100 байт на кортеж из двух float.
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _put_varint(out, value):
+    value = _zigzag(value)
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_block(times, counts):
+    out = bytearray()
+    previous_time = times[0]
+    previous_delta = 0
+    previous_count = counts[0]
+    _put_varint(out, previous_time)
+    _put_varint(out, previous_count)
+    for i in range(1, len(times)):
+        delta = times[i] - previous_time
+        _put_varint(out, delta - previous_delta)
+        _put_varint(out, counts[i] - previous_count)
+        previous_time = times[i]
+        previous_delta = delta
+        previous_count = counts[i]
+    return bytes(out)
+
+
+def decode_block(data, size):
+    times = array('q')
+    counts = array('q')
+    position = 0
+    values = []
+    # Разбор varint (с обратным zigzag) в плоский список, затем восстановление сумм
+    length = len(data)
+    while position < length:
+        value = 0
+        shift = 0
+        while True:
+            byte = data[position]
+            position += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        values.append((value >> 1) ^ -(value & 1))
+
+    current_time = values[0]
+    current_count = values[1]
+    delta = 0
+    times.append(current_time)
+    counts.append(current_count)
+    for i in range(2, 2 * size, 2):
+        delta += values[i]
+        current_time += delta
+        current_count += values[i + 1]
+        times.append(current_time)
+        counts.append(current_count)
+    return times, counts
+
+
+class _Block:
+    __slots__ = ('first', 'last', 'size', 'data')
+
+    def __init__(self, times, counts):
+        self.first = times[0]
+        self.last = times[-1]
+        self.size = len(times)
+        self.data = encode_block(times, counts)
+
+
+class HistorySnapshot:
+    # Неизменяемый срез истории для чтения из другого потока (экспорт)
+    def __init__(self, history, blocks, open_times, open_counts, time_from, time_to):
+        self.divisor = history.divisor
+        self.blocks = blocks
+        self.open_times = open_times
+        self.open_counts = open_counts
+        self.time_from = history._to_ms(time_from) if time_from is not None else None
+        self.time_to = history._to_ms(time_to) if time_to is not None else None
+        self.count = sum(end - start for _, _, start, end in self._ranges(count_only=True))
+
+    def _ranges(self, count_only=False):
+        # (времена, показания, начало, конец) для каждого блока в интервале
+        time_from = self.time_from
+        time_to = self.time_to
+        parts = [(block, block.first, block.last, block.size) for block in self.blocks]
+        if self.open_times:
+            parts.append((None, self.open_times[0], self.open_times[-1], len(self.open_times)))
+        for block, first, last, size in parts:
+            if time_from is not None and last < time_from:
+                continue
+            if time_to is not None and first > time_to:
+                break
+            inside = (time_from is None or first >= time_from) and (time_to is None or last <= time_to)
+            if count_only and inside:
+                yield None, None, 0, size
+                continue
+            if block is None:
+                times, counts = self.open_times, self.open_counts
+            else:
+                times, counts = decode_block(block.data, block.size)
+            start = bisect.bisect_left(times, time_from) if time_from is not None else 0
+            end = bisect.bisect_right(times, time_to) if time_to is not None else size
+            yield times, counts, start, end
+
+    def chunks(self):
+        # Куски строк (время в секундах, вес) - формат, который ожидают функции экспорта
+        divisor = self.divisor
+        for times, counts, start, end in self._ranges():
+            if end > start:
+                yield [(times[i] / 1000, counts[i] / divisor) for i in range(start, end)]
+
+    def __iter__(self):
+        for chunk in self.chunks():
+            yield from chunk
+
+
+class CompressedHistory:
+    # История отсчетов одних весов. Новые точки копятся в открытом блоке (array),
+    # заполненный блок сжимается. Старые блоки удаляются по max_age.
+    def __init__(self, decimals=3, block_size=1024, max_age=None):
+        self.decimals = decimals
+        self.divisor = 10 ** decimals
+        self.block_size = block_size
+        self.max_age = max_age
+        self.blocks = deque()
+        self.open_times = array('q')
+        self.open_counts = array('q')
+        self.sealed_count = 0
+
+    def _to_ms(self, timestamp):
+        return int(round(timestamp * 1000))
+
+    def append(self, timestamp, weight):
+        self.open_times.append(self._to_ms(timestamp))
+        self.open_counts.append(int(round(weight * self.divisor)))
+        if len(self.open_times) >= self.block_size:
+            self._seal()
+
+    def _seal(self):
+        block = _Block(self.open_times, self.open_counts)
+        self.blocks.append(block)
+        self.sealed_count += block.size
+        self.open_times = array('q')
+        self.open_counts = array('q')
+        if self.max_age is not None:
+            oldest = block.last - self.max_age * 1000
+            while self.blocks and self.blocks[0].last < oldest:
+                self.sealed_count -= self.blocks.popleft().size
+
+    def __len__(self):
+        return self.sealed_count + len(self.open_times)
+
+    @property
+    def last_time(self):
+        if self.open_times:
+            return self.open_times[-1] / 1000
+        if self.blocks:
+            return self.blocks[-1].last / 1000
+        return None
+
+    @property
+    def nbytes(self):
+        return (sum(len(block.data) for block in self.blocks)
+                + self.open_times.itemsize * len(self.open_times) * 2)
+
+    def snapshot(self, time_from=None, time_to=None):
+        return HistorySnapshot(self, list(self.blocks), array('q', self.open_times),
+                               array('q', self.open_counts), time_from, time_to)
+
+    def range(self, time_from=None, time_to=None):
+        return iter(self.snapshot(time_from, time_to))
+
+    def clear(self):
+        self.blocks.clear()
+        self.open_times = array('q')
+        self.open_counts = array('q')
+        self.sealed_count = 0
@@ -0,0 +1,103 @@
+from kivy.uix.widget import Widget
+from kivy.uix.label import Label
+from kivy.clock import Clock
+from kivy.graphics import Color, Line, Rectangle
+from kivy.properties import ObjectProperty, NumericProperty, ListProperty
+
+
+class WeightChart(Widget):
+    # Источник данных - deque/список пар (время, вес), который пополняет приложение
+    history = ObjectProperty(None, allownone=True)
+    fps = NumericProperty(10)
+    line_color = ListProperty([0.27, 0.51, 0.71, 1])  # SteelBlue
+    background_color = ListProperty([1, 1, 1, 1])
+    padding = NumericProperty(30)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Все графические инструкции создаются один раз, дальше меняются только точки
+        with self.canvas:
+            self._bg_color = Color(*self.background_color)
+            self._bg = Rectangle(pos=self.pos, size=self.size)
+            Color(0.6, 0.6, 0.6, 1)
+            self._frame = Line(rectangle=(0, 0, 0, 0), width=1)
+            self._line_color = Color(*self.line_color)
+            self._line = Line(points=[], width=1.5)
+
+        self._max_label = Label(color=(0, 0, 0, 1), font_size=12, size_hint=(None, None))
+        self._min_label = Label(color=(0, 0, 0, 1), font_size=12, size_hint=(None, None))
+        self.add_widget(self._max_label)
+        self.add_widget(self._min_label)
+
+        self._last_state = None
+        self._event = None
+        self.bind(pos=self._on_geometry, size=self._on_geometry)
+        self.bind(line_color=self._on_colors, background_color=self._on_colors)
+        self.bind(fps=self._reschedule)
+        self._reschedule()
+
+    def _reschedule(self, *args):
+        if self._event is not None:
+            self._event.cancel()
+        self._event = Clock.schedule_interval(self.redraw, 1.0 / max(self.fps, 1))
+
+    def _on_colors(self, *args):
+        self._bg_color.rgba = self.background_color
+        self._line_color.rgba = self.line_color
+
+    def _on_geometry(self, *args):
+        self._bg.pos = self.pos
+        self._bg.size = self.size
+        self._last_state = None
+        self.redraw()
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
+
+    def redraw(self, dt=None):
+        if not self.history:
+            if self._line.points:
+                self._line.points = []
+            return
+
+        # Перерисовываем, только если история или размер изменились
+        last = self.history[-1]
+        state = (len(self.history), last, self.size[0], self.size[1])
+        if state == self._last_state:
+            return
+        self._last_state = state
+
+        data = list(self.history)
+        min_x = data[0][0]
+        max_x = data[-1][0]
+        min_y = min(w for _, w in data)
+        max_y = max(w for _, w in data)
+        if max_y == min_y:
+            min_y -= 1.0
+            max_y += 1.0
+
+        pad = self.padding
+        left = self.x + pad
+        bottom = self.y + pad
+        width = max(self.width - 2 * pad, 1)
+        height = max(self.height - 2 * pad, 1)
+        kx = width / (max_x - min_x) if max_x != min_x else 0
+        ky = height / (max_y - min_y)
+
+        points = []
+        for t, w in data:
+            points.append(left + (t - min_x) * kx)
+            points.append(bottom + (w - min_y) * ky)
+        self._line.points = points
+        self._frame.rectangle = (left, bottom, width, height)
+
+        self._max_label.text = f"{max_y:.3f}"
+        self._min_label.text = f"{min_y:.3f}"
+        self._max_label.texture_update()
+        self._min_label.texture_update()
+        self._max_label.size = self._max_label.texture_size
+        self._min_label.size = self._min_label.texture_size
+        self._max_label.pos = (left, bottom + height)
+        self._min_label.pos = (left, self.y)
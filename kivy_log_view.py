@@ -0,0 +1,75 @@
+from collections import deque
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.properties import NumericProperty
+from kivy.uix.recycleview import RecycleView
+
+Builder.load_string('''
+<LogLine@Label>:
+    color: 0, 0, 0, 1
+    font_size: 12
+    text_size: self.width, None
+    halign: 'left'
+    valign: 'middle'
+    shorten: True
+    shorten_from: 'right'
+
+<LogView>:
+    viewclass: 'LogLine'
+    bar_width: 8
+    scroll_type: ['bars', 'content']
+    canvas.before:
+        Color:
+            rgba: 1, 1, 1, 1
+        Rectangle:
+            pos: self.pos
+            size: self.size
+    RecycleBoxLayout:
+        default_size: None, 20
+        default_size_hint: 1, None
+        size_hint_y: None
+        height: self.minimum_height
+        orientation: 'vertical'
+''')
+
+
+class LogView(RecycleView):
+    # Лог на RecycleView: строки хранятся в ограниченной deque,
+    # на экране создаются виджеты только для видимых строк.
+    # append_line можно вызывать из любого потока, экран обновляется раз в кадр.
+    max_lines = NumericProperty(2000)
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lines = deque(maxlen=self.max_lines)
+        self.pending = deque()
+        self.bind(max_lines=self._on_max_lines)
+        self._event = Clock.schedule_interval(self.flush, 0)
+
+    def _on_max_lines(self, instance, value):
+        self.lines = deque(self.lines, maxlen=int(value))
+
+    def append_line(self, text):
+        self.pending.append(text)
+
+    def flush(self, dt=None):
+        if not self.pending:
+            return
+        while self.pending:
+            self.lines.append(self.pending.popleft())
+
+        # Следуем за концом лога, если пользователь не прокрутил его вверх
+        layout = self.layout_manager
+        at_bottom = self.scroll_y <= 0.01 or layout is None or layout.height <= self.height
+        self.data = [{'text': line} for line in self.lines]
+        if at_bottom:
+            self.scroll_y = 0
+
+    def text(self):
+        self.flush()
+        return "\n".join(self.lines) + "\n" if self.lines else ""
+
+    def stop(self):
+        if self._event is not None:
+            self._event.cancel()
+            self._event = None
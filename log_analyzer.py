@@ -0,0 +1,437 @@
+import argparse
+import bisect
+import glob
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+from array import array
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+from log_retention import open_log
+from weight_archive import STATUS_STABLE, SegmentReader
+
+# Разбор логов вида "[HH:MM:SS] сообщение" (logs/weight_scale_*.log, weight_scale_export_*.log)
+# и сегментов архива weight_archive (archive/<весы>/ГГГГММДД.seg).
+# Отсчеты веса в логе main.py пишутся только при включенной трассировке parse (scale_trace),
+# без нее в логе остаются подключения и ошибки. Все отсчеты есть в архиве - его каталог
+# можно передать в build вместе с логами.
+LINE_RE = re.compile(r"^\[(\d\d):(\d\d):(\d\d)\] (.*)$")
+START_RE = re.compile(r"^Начало записи: (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)")
+FILE_DATE_RE = re.compile(r"(\d{8})_(\d{6})")
+TRACE_PREFIX_RE = re.compile(r"^\[(?:raw|frame|parse|ui)\] ")
+
+SAMPLE_PATTERNS = [
+    # (регулярное выражение, группа канала или None, признак стабильного веса)
+    (re.compile(r"^Канал (\d+), стабильный вес: ([-+]?\d+(?:\.\d+)?) кг"), 1, True),
+    (re.compile(r"^Канал (\d+), вес: ([-+]?\d+(?:\.\d+)?) кг"), 1, False),
+    (re.compile(r"^Стабильный вес: ([-+]?\d+(?:\.\d+)?) кг"), None, True),
+    (re.compile(r"^Вес: ([-+]?\d+(?:\.\d+)?) кг"), None, False),
+]
+CONNECT_RE = re.compile(r"^Подключено к (\S+)")
+ATTEMPT_RE = re.compile(r"^Попытка подключения к (\S+)")
+
+EVENT_CONNECT = 0
+EVENT_DISCONNECT = 1
+EVENT_ERROR = 2
+EVENT_KINDS = ["connect", "disconnect", "error"]
+
+SAMPLE_COLUMNS = (("time", 'd'), ("value", 'd'), ("scale", 'H'), ("stable", 'B'))
+EVENT_COLUMNS = (("time", 'd'), ("kind", 'B'), ("scale", 'H'))
+SCALE_COLUMN = 2
+MERGE_BUFFER = 65536
+
+
+def file_start_time(path):
+    # Дата берется из заголовка лога, а если его нет - из имени файла
+    with open_log(path) as f:
+        for _ in range(5):
+            line = f.readline()
+            if not line:
+                break
+            match = START_RE.match(line.strip())
+            if match:
+                return datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+    match = FILE_DATE_RE.search(os.path.basename(path))
+    if match:
+        return datetime.strptime(match.group(1) + match.group(2), "%Y%m%d%H%M%S")
+    return datetime.fromtimestamp(os.path.getmtime(path))
+
+
+def parse_file(path):
+    # Потоковый разбор одного файла; возвращает колонки в виде байтов
+    if path.endswith(".seg"):
+        return parse_segment(path)
+    start = file_start_time(path)
+    day = datetime(start.year, start.month, start.day)
+    previous_seconds = None
+
+    sample_time = array('d')
+    sample_value = array('d')
+    sample_scale = array('H')
+    sample_stable = array('B')
+    event_time = array('d')
+    event_kind = array('B')
+    event_scale = array('H')
+    event_text = []
+    scales = {}
+    port = "?"
+
+    def scale_id(name):
+        if name not in scales:
+            scales[name] = len(scales)
+        return scales[name]
+
+    with open_log(path) as f:
+        for line in f:
+            match = LINE_RE.match(line)
+            if not match:
+                continue
+            hours, minutes, seconds, message = match.groups()
+            message = TRACE_PREFIX_RE.sub("", message, count=1)
+            seconds_of_day = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+            # Переход через полночь
+            if previous_seconds is not None and seconds_of_day < previous_seconds - 3600:
+                day += timedelta(days=1)
+            previous_seconds = seconds_of_day
+            timestamp = day.timestamp() + seconds_of_day
+
+            for pattern, channel_group, stable in SAMPLE_PATTERNS:
+                sample = pattern.match(message)
+                if sample:
+                    if channel_group is None:
+                        name = port
+                        value = sample.group(1)
+                    else:
+                        name = f"{port}:{sample.group(channel_group)}"
+                        value = sample.group(2)
+                    sample_time.append(timestamp)
+                    sample_value.append(float(value))
+                    sample_scale.append(scale_id(name))
+                    sample_stable.append(1 if stable else 0)
+                    break
+            else:
+                connect = CONNECT_RE.match(message)
+                attempt = ATTEMPT_RE.match(message)
+                if attempt:
+                    port = attempt.group(1)
+                elif connect:
+                    port = connect.group(1)
+                    event_time.append(timestamp)
+                    event_kind.append(EVENT_CONNECT)
+                    event_scale.append(scale_id(port))
+                    event_text.append(message)
+                elif message.startswith("Отключено"):
+                    event_time.append(timestamp)
+                    event_kind.append(EVENT_DISCONNECT)
+                    event_scale.append(scale_id(port))
+                    event_text.append(message)
+                elif "Ошибка" in message:
+                    event_time.append(timestamp)
+                    event_kind.append(EVENT_ERROR)
+                    event_scale.append(scale_id(port))
+                    event_text.append(message)
+
+    return _result(path, scales, (sample_time, sample_value, sample_scale, sample_stable),
+                   (event_time, event_kind, event_scale, event_text))
+
+
+def parse_segment(path):
+    # Сегмент архива: одни весы (имя каталога), все отсчеты со статусом
+    name = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    sample_time = array('d')
+    sample_value = array('d')
+    sample_stable = array('B')
+    reader = SegmentReader(path)
+    try:
+        for timestamp, weight, status in reader.samples():
+            sample_time.append(timestamp)
+            sample_value.append(weight)
+            sample_stable.append(1 if status & STATUS_STABLE else 0)
+    finally:
+        reader.close()
+    sample_scale = array('H', bytes(2 * len(sample_time)))
+    return _result(path, {name: 0}, (sample_time, sample_value, sample_scale, sample_stable),
+                   (array('d'), array('B'), array('H'), []))
+
+
+def _result(path, scales, samples, events):
+    # Колонки файла упорядочены по времени: на этом держится слияние в build_store.
+    # Время в логе может пойти назад (перевели часы) - тогда файл сортируется целиком
+    samples = _sorted_by_time(*samples)
+    events = _sorted_by_time(*events)
+    return {
+        "path": path,
+        "scales": sorted(scales, key=scales.get),
+        "samples": tuple(column.tobytes() for column in samples),
+        "events": tuple(column.tobytes() for column in events[:3]) + (events[3],),
+    }
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ("weight_scale_*.log", "weight_scale_*.log.gz", "weight_scale_*.log.xz"):
+                files.extend(glob.glob(os.path.join(path, pattern)))
+            files.extend(glob.glob(os.path.join(path, "**", "*.seg"), recursive=True))
+        else:
+            files.extend(glob.glob(path))
+    return sorted(set(files))
+
+
+def _sorted_by_time(times, *columns):
+    if all(times[i] <= times[i + 1] for i in range(len(times) - 1)):
+        return [times] + list(columns)
+    order = sorted(range(len(times)), key=times.__getitem__)
+    result = [array(times.typecode, (times[i] for i in order))]
+    for column in columns:
+        if isinstance(column, list):
+            result.append([column[i] for i in order])
+        else:
+            result.append(array(column.typecode, (column[i] for i in order)))
+    return result
+
+
+def _map_column(path, typecode, maps):
+    if os.path.getsize(path) == 0:
+        return memoryview(b"").cast(typecode)
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    base = memoryview(mapped)
+    column = base.cast(typecode)
+    maps.append((mapped, base, column))
+    return column
+
+
+def _unmap(maps):
+    for mapped, base, column in maps:
+        column.release()
+        base.release()
+        mapped.close()
+
+
+def _merge(parts, columns, mappings, output, prefix, texts=None):
+    # Слияние k отсортированных файлов (heapq.merge по колонке времени).
+    # Колонки частей читаются через mmap, результат пишется блоками по MERGE_BUFFER строк:
+    # в памяти нет ни всех колонок, ни общего индекса сортировки
+    maps = []
+    sources = [[_map_column(f"{part}.{prefix}.{name}", code, maps) for name, code in columns]
+               for part in parts]
+    files = [open(os.path.join(output, f"{prefix}.{name}"), 'wb') for name, _ in columns]
+    buffers = [array(code) for _, code in columns]
+    merged_texts = []
+    count = 0
+    order = None
+    try:
+        order = heapq.merge(*(zip(source[0], repeat(part), range(len(source[0])))
+                              for part, source in enumerate(sources)))
+        for _, part, i in order:
+            source = sources[part]
+            for k, column in enumerate(source):
+                buffers[k].append(mappings[part][column[i]] if k == SCALE_COLUMN else column[i])
+            if texts is not None:
+                merged_texts.append(texts[part][i])
+            count += 1
+            if len(buffers[0]) >= MERGE_BUFFER:
+                for buffer, f in zip(buffers, files):
+                    buffer.tofile(f)
+                buffers = [array(code) for _, code in columns]
+        for buffer, f in zip(buffers, files):
+            buffer.tofile(f)
+    finally:
+        for f in files:
+            f.close()
+        del order, sources
+        _unmap(maps)
+    return count, merged_texts
+
+
+def build_store(paths, output, workers=None):
+    files = collect_files(paths)
+    if not files:
+        raise ValueError("Не найдено ни одного файла лога")
+    if not os.path.exists(output):
+        os.makedirs(output)
+
+    scales = {}
+    mappings = []
+    texts = []
+    spool = tempfile.mkdtemp(prefix=".spool_", dir=output)
+    parts = [os.path.join(spool, str(i)) for i in range(len(files))]
+    try:
+        # Файлы разбираются параллельно в пуле процессов; колонки каждого файла
+        # сразу пишутся во временный каталог и в памяти не накапливаются
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for part, result in zip(parts, pool.map(parse_file, files, chunksize=1)):
+                mappings.append([scales.setdefault(name, len(scales)) for name in result["scales"]])
+                for prefix, columns in (("samples", SAMPLE_COLUMNS), ("events", EVENT_COLUMNS)):
+                    for (name, _), data in zip(columns, result[prefix]):
+                        with open(f"{part}.{prefix}.{name}", 'wb') as f:
+                            f.write(data)
+                texts.append(result["events"][3])
+
+        sample_count, _ = _merge(parts, SAMPLE_COLUMNS, mappings, output, "samples")
+        event_count, event_texts = _merge(parts, EVENT_COLUMNS, mappings, output, "events", texts)
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+    with open(os.path.join(output, "events.text.json"), 'w', encoding='utf-8') as f:
+        json.dump(event_texts, f, ensure_ascii=False)
+
+    meta = {
+        "files": files,
+        "scales": sorted(scales, key=scales.get),
+        "event_kinds": EVENT_KINDS,
+        "samples": sample_count,
+        "events": event_count,
+    }
+    with open(os.path.join(output, "meta.json"), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+class ColumnStore:
+    # Колонки отображаются в память и читаются без разбора; колонка времени отсортирована
+    # и служит индексом для выборки по интервалу
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.scales = self.meta["scales"]
+        self._maps = []
+        self.samples = {name: _map_column(os.path.join(path, f"samples.{name}"), code, self._maps)
+                        for name, code in SAMPLE_COLUMNS}
+        self.events = {name: _map_column(os.path.join(path, f"events.{name}"), code, self._maps)
+                       for name, code in EVENT_COLUMNS}
+        self._event_text = None
+
+    @property
+    def event_text(self):
+        if self._event_text is None:
+            with open(os.path.join(self.path, "events.text.json"), encoding='utf-8') as f:
+                self._event_text = json.load(f)
+        return self._event_text
+
+    def _range(self, times, time_from, time_to):
+        start = bisect.bisect_left(times, time_from) if time_from is not None else 0
+        end = bisect.bisect_right(times, time_to) if time_to is not None else len(times)
+        return start, end
+
+    def query_samples(self, time_from=None, time_to=None, scale=None, stable_only=False):
+        times = self.samples["time"]
+        start, end = self._range(times, time_from, time_to)
+        scale_id = self.scales.index(scale) if scale in self.scales else None
+        if scale is not None and scale_id is None:
+            return
+        values = self.samples["value"]
+        scales = self.samples["scale"]
+        stable = self.samples["stable"]
+        for i in range(start, end):
+            if scale_id is not None and scales[i] != scale_id:
+                continue
+            if stable_only and not stable[i]:
+                continue
+            yield times[i], self.scales[scales[i]], values[i], bool(stable[i])
+
+    def query_events(self, time_from=None, time_to=None, kinds=None):
+        times = self.events["time"]
+        start, end = self._range(times, time_from, time_to)
+        kind_column = self.events["kind"]
+        scales = self.events["scale"]
+        for i in range(start, end):
+            kind = EVENT_KINDS[kind_column[i]]
+            if kinds and kind not in kinds:
+                continue
+            yield times[i], self.scales[scales[i]], kind, self.event_text[i]
+
+    def close(self):
+        self.samples.clear()
+        self.events.clear()
+        _unmap(self._maps)
+        self._maps = []
+
+
+def parse_time(text, default_day):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(text, fmt).timestamp()
+        except ValueError:
+            pass
+    for fmt in ("%H:%M:%S", "%H:%M"):
+        try:
+            moment = datetime.strptime(text, fmt)
+            return datetime.combine(default_day, moment.time()).timestamp()
+        except ValueError:
+            pass
+    raise ValueError(f"Не удалось разобрать время: {text}")
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Анализ логов весовых терминалов")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="разобрать логи в колоночное хранилище")
+    build.add_argument("paths", nargs="+", help="файлы или каталоги с логами")
+    build.add_argument("-o", "--output", default="log_store", help="каталог хранилища")
+    build.add_argument("-j", "--jobs", type=int, default=None, help="число процессов")
+
+    query = commands.add_parser("query", help="выборка из хранилища")
+    query.add_argument("store", help="каталог хранилища")
+    query.add_argument("--from", dest="time_from", help="начало: 'ГГГГ-ММ-ДД ЧЧ:ММ' или 'ЧЧ:ММ'")
+    query.add_argument("--to", dest="time_to", help="конец: 'ГГГГ-ММ-ДД ЧЧ:ММ' или 'ЧЧ:ММ'")
+    query.add_argument("--scale", help="весы (порт, например COM4 или COM4:1)")
+    query.add_argument("--stable", action="store_true", help="только стабильные веса")
+    query.add_argument("--events", action="store_true", help="вывести подключения и ошибки")
+    query.add_argument("--errors", action="store_true", help="вывести только ошибки")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        meta = build_store(args.paths, args.output, args.jobs)
+        print(f"Файлов: {len(meta['files'])}, отсчетов веса: {meta['samples']}, "
+              f"событий: {meta['events']}, весов: {', '.join(meta['scales']) or 'нет'}")
+        if not meta['samples']:
+            print("Отсчетов веса нет: в лог они пишутся только с трассировкой parse. "
+                  "Добавьте каталог архива (archive) к списку файлов")
+        return 0
+
+    store = ColumnStore(args.store)
+    times = store.samples["time"] if len(store.samples["time"]) else store.events["time"]
+    default_day = datetime.fromtimestamp(times[0]).date() if len(times) else datetime.now().date()
+    time_from = parse_time(args.time_from, default_day) if args.time_from else None
+    time_to = parse_time(args.time_to, default_day) if args.time_to else None
+
+    if args.events or args.errors:
+        kinds = {"error"} if args.errors else None
+        for timestamp, scale, kind, text in store.query_events(time_from, time_to, kinds):
+            print(f"{format_time(timestamp)}\t{scale}\t{kind}\t{text}")
+    else:
+        count = 0
+        total = 0.0
+        minimum = maximum = None
+        for timestamp, scale, value, stable in store.query_samples(time_from, time_to, args.scale, args.stable):
+            print(f"{format_time(timestamp)}\t{scale}\t{value:.3f}\t{'стаб' if stable else ''}")
+            count += 1
+            total += value
+            minimum = value if minimum is None else min(minimum, value)
+            maximum = value if maximum is None else max(maximum, value)
+        if count:
+            print(f"Отсчетов: {count}, мин: {minimum:.3f}, макс: {maximum:.3f}, среднее: {total / count:.3f}")
+        else:
+            print("Нет данных за указанный интервал")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
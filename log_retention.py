@@ -0,0 +1,159 @@
+import gzip
+import lzma
+import os
+import shutil
+import sys
+import threading
+import time
+from queue import Queue, Empty
+
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open),
+}
+LOG_EXTENSIONS = ('.log',)
+COMPRESSED_EXTENSIONS = ('.gz', '.xz')
+# Файлы захвата (raw_capture) читаются через mmap, поэтому не сжимаются:
+# для них действуют только ограничения объема и возраста
+UNCOMPRESSED_EXTENSIONS = ('.cap',)
+
+
+def open_log(path, mode='rt', encoding='utf-8', errors='replace'):
+    # Открывает лог независимо от того, сжат он или нет
+    if 'b' in mode:
+        encoding = None
+        errors = None
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding=encoding, errors=errors)
+    if path.endswith('.xz'):
+        return lzma.open(path, mode, encoding=encoding, errors=errors)
+    return open(path, mode, encoding=encoding, errors=errors)
+
+
+def _lower_thread_priority():
+    # На Linux приоритет задается для отдельного потока; на других ОС просто пропускаем
+    if sys.platform.startswith('linux') and hasattr(os, 'setpriority'):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError:
+            pass
+
+
+class LogRetention:
+    # Фоновое обслуживание каталога логов: сжатие закрытых файлов
+    # и удаление старых по ограничениям общего объема и возраста
+    def __init__(self, log_dir="logs", method='gzip', max_total_bytes=2 * 1024 ** 3,
+                 max_age_days=90, interval=600, active_paths=None, chunk_size=1024 * 1024,
+                 chunk_pause=0.01):
+        if method not in COMPRESSORS:
+            raise ValueError(f"Неизвестный метод сжатия: {method}")
+        self.log_dir = log_dir
+        self.method = method
+        self.max_total_bytes = max_total_bytes
+        self.max_age_days = max_age_days
+        self.interval = interval
+        # Функция, возвращающая пути файлов, которые сейчас пишутся
+        self.active_paths = active_paths or (lambda: ())
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.queue = Queue()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="log-retention", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        self.queue.put(None)
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def schedule(self, path):
+        # Закрытый (ротированный) файл - сжать в ближайшее время
+        self.queue.put(path)
+
+    def _run(self):
+        _lower_thread_priority()
+        next_sweep = 0
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_sweep:
+                self.sweep()
+                next_sweep = now + self.interval
+            try:
+                path = self.queue.get(timeout=max(next_sweep - time.monotonic(), 0.1))
+            except Empty:
+                continue
+            if path is not None:
+                self._safe_compress(path)
+
+    def sweep(self):
+        if not os.path.isdir(self.log_dir):
+            return
+        active = {os.path.abspath(p) for p in self.active_paths() if p}
+        for name in os.listdir(self.log_dir):
+            path = os.path.join(self.log_dir, name)
+            if self.stop_event.is_set():
+                return
+            if name.endswith(LOG_EXTENSIONS) and os.path.abspath(path) not in active:
+                self._safe_compress(path)
+        self.enforce_budgets()
+
+    def _safe_compress(self, path):
+        if not path.endswith(LOG_EXTENSIONS):
+            return
+        try:
+            self.compress(path)
+        except Exception as e:
+            print(f"Ошибка сжатия лога {path}: {str(e)}")
+
+    def compress(self, path):
+        if not os.path.exists(path):
+            return None
+        extension, opener = COMPRESSORS[self.method]
+        target = path + extension
+        temp = target + ".tmp"
+        with open(path, 'rb') as source, opener(temp, 'wb') as destination:
+            while True:
+                chunk = source.read(self.chunk_size)
+                if not chunk:
+                    break
+                destination.write(chunk)
+                # Небольшие паузы, чтобы не мешать приему данных
+                if self.chunk_pause:
+                    time.sleep(self.chunk_pause)
+        shutil.copystat(path, temp)
+        os.replace(temp, target)
+        os.remove(path)
+        return target
+
+    def enforce_budgets(self):
+        active = {os.path.abspath(p) for p in self.active_paths() if p}
+        files = []
+        for name in os.listdir(self.log_dir):
+            if not name.endswith(LOG_EXTENSIONS + COMPRESSED_EXTENSIONS + UNCOMPRESSED_EXTENSIONS):
+                continue
+            path = os.path.join(self.log_dir, name)
+            if os.path.abspath(path) in active:
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        min_mtime = time.time() - self.max_age_days * 86400 if self.max_age_days else None
+        for mtime, size, path in files:
+            too_old = min_mtime is not None and mtime < min_mtime
+            over_budget = self.max_total_bytes is not None and total > self.max_total_bytes
+            if not (too_old or over_budget):
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                print(f"Не удалось удалить лог {path}: {str(e)}")
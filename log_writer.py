@@ -0,0 +1,117 @@
+import os
+import time
+from datetime import datetime
+from queue import Queue, Empty
+from threading import Thread
+
+_STOP = object()
+
+
+class AsyncLogWriter:
+    # Запись лога в отдельном потоке: вызывающий код только кладет строку в очередь.
+    # Поток пишет через большой буфер и сбрасывает его на диск по интервалу
+    # или по объему, а файл ротируется по размеру и по времени.
+    def __init__(self, log_dir="logs", prefix="weight_scale", max_bytes=10 * 1024 * 1024,
+                 max_age=24 * 3600, flush_interval=1.0, flush_size=64 * 1024,
+                 buffer_size=1024 * 1024):
+        self.log_dir = log_dir
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.buffer_size = buffer_size
+        self.queue = Queue()
+        self.file = None
+        self.path = None
+        self.opened_at = 0
+        self.on_rotate = None  # вызывается с путем закрытого файла
+        self.closed = False
+
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+        self._open_file()
+
+        self.thread = Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, line):
+        if self.closed:
+            # Файл уже закрыт: строка не теряется молча, а уходит в консоль
+            print(f"Лог закрыт, строка не записана: {line.rstrip()}")
+            return False
+        self.queue.put(line)
+        return True
+
+    def close(self):
+        self.closed = True
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+    def _open_file(self):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.log_dir, f"{self.prefix}_{timestamp}.log")
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(self.log_dir, f"{self.prefix}_{timestamp}_{counter}.log")
+            counter += 1
+
+        self.file = open(path, 'w', encoding='utf-8', buffering=self.buffer_size)
+        self.path = path
+        self.opened_at = time.monotonic()
+
+        # Записываем заголовок в лог
+        self.file.write("=== Лог весового прибора ===\n")
+        self.file.write(f"Начало записи: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        self.file.write("=" * 30 + "\n\n")
+        self.file.flush()
+
+    def _rotate_if_needed(self):
+        too_big = self.file.tell() >= self.max_bytes
+        too_old = time.monotonic() - self.opened_at >= self.max_age
+        if not (too_big or too_old):
+            return
+        closed_path = self.path
+        self.file.close()
+        self._open_file()
+        if self.on_rotate is not None:
+            try:
+                self.on_rotate(closed_path)
+            except Exception as e:
+                print(f"Ошибка обработки ротации лога: {str(e)}")
+
+    def _write_batch(self, batch):
+        try:
+            self.file.write("".join(batch))
+            self.file.flush()
+            self._rotate_if_needed()
+        except Exception as e:
+            print(f"Ошибка записи в лог-файл: {str(e)}")
+
+    def _run(self):
+        batch = []
+        batch_size = 0
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                item = None
+
+            if item is _STOP:
+                if batch:
+                    self._write_batch(batch)
+                self.file.close()
+                return
+
+            if item is not None:
+                batch.append(item)
+                batch_size += len(item)
+
+            now = time.monotonic()
+            if batch and (batch_size >= self.flush_size or now - last_flush >= self.flush_interval):
+                self._write_batch(batch)
+                batch = []
+                batch_size = 0
+                last_flush = now
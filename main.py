@@ -8,28 +8,63 @@ from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
 from kivy.uix.popup import Popup
+import serial
 from serial import Serial, SerialException
-from threading import Thread, Lock
+from threading import Thread, current_thread
 from queue import Queue
+from collections import deque
 from datetime import datetime
 import os
 import time
+from kivy_chart import WeightChart
+from kivy_log_view import LogView
+from weight_stats import ScaleStats
+from serial_bridge import DEFAULT_HOST, DEFAULT_PORT
+from stability import StabilityDetector
+from alerts import AlertManager
+from log_writer import AsyncLogWriter
+from log_retention import LogRetention
+from raw_capture import CaptureWriter
+from scale_trace import Tracer, HexBytes, RAW, FRAME, PARSE, UI
+
+# Адрес моста serial_bridge на этом компьютере: порт держит мост, программа - его клиент
+BRIDGE_URL = f"socket://{DEFAULT_HOST}:{DEFAULT_PORT}"
 
 class WeightScaleApp(TabbedPanel):
     current_weight = StringProperty("---")
     status = StringProperty("Не подключено")
-    log_text = StringProperty("")
+    stats_text = StringProperty("")
+    alert_text = StringProperty("")
     target_weight = NumericProperty(0)
     protocols = ListProperty(["Auto", "MIDL-MI-VDA", "ТОКВЕС SH-50", "Микросим М0601", "Ньютон 42"])
     is_connected = BooleanProperty(False)
+    # Каналы, по которым пришли данные, и канал, показанный на графике
+    channels = ListProperty(["1"])
+    chart_channel = NumericProperty(1)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.serial = None
+        self.capture = None
+        self.read_thread = None
         self.data_queue = Queue()
-        self.log_lock = Lock()
+        # История для графика по каналам: (время, вес), старые точки вытесняются автоматически
+        self.channel_history = {}
+        self.ids.weight_chart.history = self.history_for(1)
+        # Скользящая статистика по каждому каналу (весам)
+        self.channel_stats = {}
+        # Детекторы стабильного веса по каналам
+        self.channel_stability = {}
+        # Очередь оповещений с гистерезисом, разбирается по таймеру в GUI-потоке
+        self.alerts = AlertManager()
+        self._alert_hide_event = None
+        Clock.schedule_interval(self.process_alerts, 0.1)
+        self.log_writer = None
         self.log_file = None
         self.init_log_file()
+        # Отладочная трассировка по категориям, по умолчанию выключена
+        self.tracer = Tracer(self.log_message)
+        self.tracer.install_signal_handlers(on_change=self.sync_trace_checkboxes)
         self.protocol_info = {
             "MIDL-MI-VDA": {"zero_cmd": "Z\r\n", "cal_cmd": "CAL {}\r\n"},
             "ТОКВЕС SH-50": {"zero_cmd": "T\r\n", "cal_cmd": "CAL {}\r\n"},
@@ -39,25 +74,41 @@ class WeightScaleApp(TabbedPanel):
         Clock.schedule_interval(self.process_queue, 0.1)
 
     def init_log_file(self):
-        # Создаем директорию для логов, если её нет
-        log_dir = "logs"
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-        
-        # Создаем имя файла с текущей датой и временем
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log_file = os.path.join(log_dir, f"weight_scale_{timestamp}.log")
+        # Файл лога (logs/weight_scale_<время>.log) ведет отдельный поток записи,
+        # он же ротирует файлы по размеру и времени
+        self.log_writer = AsyncLogWriter(log_dir="logs")
+        self.log_file = self.log_writer.path
         
-        # Записываем заголовок в лог
-        with open(self.log_file, 'w', encoding='utf-8') as f:
-            f.write(f"=== Лог весового прибора ===\n")
-            f.write(f"Начало записи: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 30 + "\n\n")
+        # Сжатие закрытых логов и контроль объема каталога в фоновом потоке
+        self.log_retention = LogRetention(log_dir="logs", active_paths=self.active_log_paths).start()
+        self.log_writer.on_rotate = self.log_retention.schedule
+
+    def active_log_paths(self):
+        capture = self.capture
+        return (self.log_writer.path, capture.path if capture else None)
 
     def process_queue(self, dt):
         while not self.data_queue.empty():
             data = self.data_queue.get()
-            self.process_weight_data(data)
+            if isinstance(data, tuple):
+                self.process_channel_weight(*data)
+            else:
+                self.process_weight_data(data)
+
+    def process_channel_weight(self, channel, weight, stable, overload, is_zero_proc):
+        # Значение канала Ньютон 42, разобранное в потоке чтения
+        self.current_weight = f"{weight:.3f} кг"
+        if stable:
+            self.status = "Стабильно"
+        elif overload:
+            self.status = "Перегрузка"
+        elif is_zero_proc:
+            self.status = "Обнуление"
+        else:
+            self.status = "Нестабильно"
+        self.history_for(channel).append((time.time(), weight))
+        self.update_stats(channel, weight)
+        self.update_stability(channel, weight, stable)
 
     def toggle_connection(self):
         if self.is_connected:
@@ -84,15 +135,16 @@ class WeightScaleApp(TabbedPanel):
             
             # Проверяем, доступен ли порт
             try:
-                test_serial = Serial(port)
+                test_serial = serial.serial_for_url(port)
                 test_serial.close()
                 time.sleep(0.5)  # Даем время на освобождение порта
             except Exception as e:
                 self.log_message(f"Порт {port} недоступен: {str(e)}")
                 return
             
-            self.serial = Serial(
-                port=port,
+            # serial_for_url открывает и COM-порт, и мост serial_bridge (socket://host:port)
+            self.serial = serial.serial_for_url(
+                port,
                 baudrate=baudrate,
                 bytesize=bytesize,
                 parity=parity,
@@ -114,6 +166,15 @@ class WeightScaleApp(TabbedPanel):
             self.status = f"Подключено к {port}"
             self.log_message(f"Подключено к {port}")
             
+            # Компактная двоичная запись всего, что присылают весы
+            try:
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                self.capture = CaptureWriter(os.path.join("logs", f"raw_capture_{timestamp}.cap"))
+                self.log_message(f"Запись сырых данных: {self.capture.path}")
+            except Exception as e:
+                self.capture = None
+                self.log_message(f"Не удалось начать запись сырых данных: {str(e)}")
+            
             # Запускаем чтение в отдельном потоке
             self.read_thread = Thread(target=self.read_serial, daemon=True)
             self.read_thread.start()
@@ -148,6 +209,14 @@ class WeightScaleApp(TabbedPanel):
                 self.log_message(f"Ошибка при закрытии порта: {str(e)}")
             finally:
                 self.serial = None
+        # Поток чтения может еще писать в захват: дожидаемся его выхода, потом закрываем файл
+        reader = self.read_thread
+        if reader is not None and reader is not current_thread() and reader.is_alive():
+            reader.join(timeout=2.0)
+        capture = self.capture
+        self.capture = None
+        if capture:
+            capture.close()
         self.status = "Не подключено"
         self.log_message("Отключено от весового прибора")
 
@@ -162,7 +231,10 @@ class WeightScaleApp(TabbedPanel):
                 if self.serial.in_waiting:
                     # Читаем все доступные данные
                     data = self.serial.read(self.serial.in_waiting)
-                    self.log_message(f"Получены сырые данные (hex): {data.hex()}")
+                    capture = self.capture
+                    if capture:
+                        capture.write(self.serial.port, data)
+                    self.tracer.trace(RAW, "Получены сырые данные (hex): {}", HexBytes(data))
                     
                     # Для Ньютон 42 обрабатываем двоичные данные
                     if self.ids.protocol_spinner.text == "Ньютон 42":
@@ -177,7 +249,11 @@ class WeightScaleApp(TabbedPanel):
                                 dpoints = (header & 0x0C) >> 2  # Бит 3-2 - десятичные знаки
                                 channels = (header & 0x03) + 1  # Бит 1-0 - количество каналов
                                 
-                                self.log_message(f"Заголовок: стабильность={stable}, перегрузка={overload}, обнуление={is_zero_proc}, десятичных знаков={dpoints}, каналов={channels}")
+                                self.tracer.trace(
+                                    FRAME,
+                                    "Заголовок: стабильность={}, перегрузка={}, обнуление={}, десятичных знаков={}, каналов={}",
+                                    stable, overload, is_zero_proc, dpoints, channels
+                                )
                                 
                                 # Проверяем размер данных
                                 expected_size = 1 + 3 * channels  # Заголовок + 3 байта на канал
@@ -187,17 +263,11 @@ class WeightScaleApp(TabbedPanel):
                                         channel_data = data[1 + channel*3:4 + channel*3]
                                         weight = self.decode_newton42_weight(channel_data, dpoints)
                                         if weight is not None:
-                                            self.current_weight = f"{weight:.3f} кг"
-                                            if stable:
-                                                self.status = "Стабильно"
-                                            elif overload:
-                                                self.status = "Перегрузка"
-                                            elif is_zero_proc:
-                                                self.status = "Обнуление"
-                                            else:
-                                                self.status = "Нестабильно"
-                                            self.check_target_weight(weight)
-                                            self.log_message(f"Канал {channel+1}, вес: {weight:.3f} кг")
+                                            # Свойства Kivy меняются только в главном потоке -
+                                            # значение канала уходит в ту же очередь, что и строки ASCII
+                                            self.data_queue.put(
+                                                (channel + 1, weight, stable, overload, is_zero_proc))
+                                            self.tracer.trace(PARSE, "Канал {}, вес: {:.3f} кг", channel + 1, weight)
                         except Exception as e:
                             self.log_message(f"Ошибка обработки двоичных данных: {str(e)}")
                     else:
@@ -207,7 +277,7 @@ class WeightScaleApp(TabbedPanel):
                             for line in lines:
                                 line = line.strip()
                                 if line:
-                                    self.log_message(f"Обработка строки: {line}")
+                                    self.tracer.trace(FRAME, "Обработка строки: {}", line)
                                     self.data_queue.put(line)
                         except Exception as e:
                             self.log_message(f"Ошибка декодирования ASCII: {str(e)}")
@@ -217,7 +287,7 @@ class WeightScaleApp(TabbedPanel):
                         if self.ids.protocol_spinner.text == "Ньютон 42":
                             try:
                                 self.serial.write(b'\x80P\r\n')
-                                self.log_message("Отправлен запрос веса (двоичный формат)")
+                                self.tracer.trace(FRAME, "Отправлен запрос веса (двоичный формат)")
                                 last_request_time = current_time
                             except Exception as e:
                                 self.log_message(f"Ошибка отправки запроса веса: {str(e)}")
@@ -257,7 +327,11 @@ class WeightScaleApp(TabbedPanel):
             # Применяем десятичную точку
             weight = value / (10 ** dpoints)
             
-            self.log_message(f"Декодирование веса: байты={weight_bytes.hex()}, знак={is_negative}, значение={value}, десятичных знаков={dpoints}, вес={weight}")
+            self.tracer.trace(
+                PARSE,
+                "Декодирование веса: байты={}, знак={}, значение={}, десятичных знаков={}, вес={}",
+                HexBytes(weight_bytes), is_negative, value, dpoints, weight
+            )
             return weight
         except Exception as e:
             self.log_message(f"Ошибка декодирования веса: {str(e)}")
@@ -268,7 +342,7 @@ class WeightScaleApp(TabbedPanel):
             protocol = self.ids.protocol_spinner.text
             weight = None
             
-            self.log_message(f"Обработка данных для протокола {protocol}: {data}")
+            self.tracer.trace(PARSE, "Обработка данных для протокола {}: {}", protocol, data)
             
             if protocol == "MIDL-MI-VDA" and data.startswith("W"):
                 weight = float(data.split()[1])
@@ -283,29 +357,64 @@ class WeightScaleApp(TabbedPanel):
                         # Формат N+00012.345 kg
                         weight_str = data[1:].split()[0]  # Убираем 'N' и берем первое число
                         weight = float(weight_str)
-                        self.log_message(f"Распознан вес Ньютон 42 (формат N): {weight}")
+                        self.tracer.trace(PARSE, "Распознан вес Ньютон 42 (формат N): {}", weight)
                     except Exception as e:
                         self.log_message(f"Ошибка парсинга веса Ньютон 42 (формат N): {str(e)}")
                 elif data.startswith('+') or data.startswith('-'):
                     try:
                         # Альтернативный формат +00012.345
                         weight = float(data.split()[0])
-                        self.log_message(f"Распознан вес (альтернативный формат): {weight}")
+                        self.tracer.trace(PARSE, "Распознан вес (альтернативный формат): {}", weight)
                     except Exception as e:
                         self.log_message(f"Ошибка парсинга альтернативного формата: {str(e)}")
                 elif data.startswith('P'):
                     # Игнорируем эхо команды P
-                    self.log_message("Получено эхо команды P")
+                    self.tracer.trace(FRAME, "Получено эхо команды P")
                 else:
                     self.log_message(f"Неизвестный формат данных Ньютон 42: {data}")
             
             if weight is not None:
                 self.current_weight = f"{weight:.3f} кг"
-                self.check_target_weight(weight)
-                self.log_message(f"Вес: {weight:.3f} кг")
+                self.history_for(1).append((time.time(), weight))
+                self.update_stats(1, weight)
+                self.update_stability(1, weight)
+                self.tracer.trace(PARSE, "Вес: {:.3f} кг", weight)
         except Exception as e:
             self.log_message(f"Ошибка обработки: {str(e)}")
 
+    def history_for(self, channel):
+        history = self.channel_history.get(channel)
+        if history is None:
+            history = self.channel_history[channel] = deque(maxlen=300)
+            if str(channel) not in self.channels:
+                self.channels = sorted(self.channels + [str(channel)], key=int)
+        return history
+
+    def on_chart_channel(self, instance, value):
+        self.ids.weight_chart.history = self.history_for(value)
+
+    def update_stats(self, channel, weight):
+        stats = self.channel_stats.get(channel)
+        if stats is None:
+            stats = self.channel_stats[channel] = ScaleStats()
+        stats.add(time.time(), weight)
+        window = stats["10 с"]
+        self.stats_text = (
+            f"Канал {channel}, за 10 с: среднее {window.mean:.3f}, σ {window.std:.3f}, "
+            f"мин {window.min:.3f}, макс {window.max:.3f}, скорость {window.slope:+.3f} кг/с"
+        )
+
+    def update_stability(self, channel, weight, stable_hint=None):
+        detector = self.channel_stability.get(channel)
+        if detector is None:
+            detector = self.channel_stability[channel] = StabilityDetector()
+            detector.subscribe(lambda event, ch=channel: self.on_stable_weight(ch, event))
+        detector.add(time.time(), weight, stable_hint)
+
+    def on_stable_weight(self, channel, event):
+        self.log_message(f"Канал {channel}, стабильный вес: {event.weight:.3f} кг")
+        self.alerts.check_target(event.timestamp, event.weight)
+
     def send_zero_command(self):
         if self.is_connected:
             protocol = self.ids.protocol_spinner.text
@@ -343,29 +452,43 @@ class WeightScaleApp(TabbedPanel):
         popup = Popup(title='Калибровка', content=content, size_hint=(0.8, 0.4))
         popup.open()
 
-    def check_target_weight(self, weight):
-        if self.target_weight > 0 and abs(weight - self.target_weight) < 0.001:
-            self.log_message(f"Достигнут целевой вес: {self.target_weight} кг")
-            self.target_weight = 0
-            self.ids.target_input.text = ""
+    def on_target_weight(self, instance, value):
+        self.alerts.set_target(value if value > 0 else None)
+
+    def process_alerts(self, dt):
+        for event in self.alerts.pop_events():
+            if event.active:
+                self.log_message(event.message)
+                self.show_alert_banner(event.message)
+
+    def show_alert_banner(self, message):
+        # Немодальный баннер вместо всплывающего окна, скрывается через 5 с
+        self.tracer.trace(UI, "Показ оповещения: {}", message)
+        self.alert_text = message
+        if self._alert_hide_event is not None:
+            self._alert_hide_event.cancel()
+        self._alert_hide_event = Clock.schedule_once(lambda dt: setattr(self, 'alert_text', ''), 5)
+
+    def set_trace(self, category, enabled):
+        self.tracer.set_enabled(category, enabled)
+        self.log_message(f"Трассировка {category}: {'включена' if enabled else 'выключена'}")
+
+    def sync_trace_checkboxes(self):
+        # Вызывается из обработчика сигнала - обновляем флажки в GUI-потоке
+        def update(dt):
+            for category in (RAW, FRAME, PARSE, UI):
+                self.ids[f"trace_{category}"].active = self.tracer.enabled(category)
+        Clock.schedule_once(update)
 
     def log_message(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}\n"
         
-        with self.log_lock:
-            # Обновляем GUI
-            Clock.schedule_once(lambda dt: self._update_log(log_entry))
-            
-            # Записываем в файл
-            try:
-                with open(self.log_file, 'a', encoding='utf-8') as f:
-                    f.write(log_entry)
-            except Exception as e:
-                print(f"Ошибка записи в лог-файл: {str(e)}")
-
-    def _update_log(self, message):
-        self.log_text += message
+        # Обновляем GUI: LogView сам заберет строку в следующем кадре
+        self.ids.log_view.append_line(log_entry[:-1])
+        
+        # Запись в файл выполняет поток AsyncLogWriter
+        self.log_writer.write(log_entry)
 
     def save_log_to_file(self):
         try:
@@ -375,7 +498,7 @@ class WeightScaleApp(TabbedPanel):
             
             # Сохраняем текущий лог в новый файл
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.log_text)
+                f.write(self.ids.log_view.text())
             
             self.log_message(f"Лог сохранен в файл: {filename}")
         except Exception as e:
@@ -385,6 +508,9 @@ class WeightScaleApp(TabbedPanel):
         self.log_message("Завершение работы программы...")
         self.disconnect()  # Используем метод disconnect
         self.log_message("Программа завершена")
+        # Дописываем буфер лога на диск перед выходом
+        self.log_writer.close()
+        self.log_retention.stop()
 
     def exit_app(self):
         self.log_message("Завершение работы программы...")
@@ -403,7 +529,7 @@ class WeightScaleApp(TabbedPanel):
                     ports.append(port)
                 except:
                     pass
-            self.ids.port_spinner.values = ports or ["Не найдены"]
+            self.ids.port_spinner.values = ports + [BRIDGE_URL]
             self.log_message(f"Найдены порты: {', '.join(ports) if ports else 'нет'}")
         except Exception as e:
             self.log_message(f"Ошибка обновления списка портов: {str(e)}")
@@ -413,5 +539,8 @@ class MainApp(App):
         Window.clearcolor = (0.95, 0.95, 0.95, 1)
         return WeightScaleApp()
 
+    def on_stop(self):
+        self.root.on_stop()
+
 if __name__ == '__main__':
     MainApp().run()
\ No newline at end of file
@@ -0,0 +1,39 @@
+from collections import deque
+from PyQt5.QtWidgets import QPlainTextEdit
+from PyQt5.QtCore import QTimer
+
+
+class BufferedLogView(QPlainTextEdit):
+    # Лог с ограниченным числом строк: старые блоки удаляет сам QPlainTextEdit,
+    # а новые строки копятся в буфере и добавляются пачкой по таймеру,
+    # поэтому память и стоимость добавления не растут за многодневную работу.
+    def __init__(self, max_lines=5000, flush_interval=200, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self.setMaximumBlockCount(max_lines)
+        self.pending = deque(maxlen=max_lines)
+
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval)
+
+    def append_line(self, text):
+        self.pending.append(text)
+
+    def flush(self):
+        if not self.pending:
+            return
+        text = "\n".join(self.pending)
+        self.pending.clear()
+
+        # Прокручиваем вниз только если пользователь не листает лог
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 4
+        self.appendPlainText(text)
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def toPlainText(self):
+        self.flush()
+        return super().toPlainText()
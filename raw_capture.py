@@ -0,0 +1,231 @@
+import bisect
+import mmap
+import os
+import struct
+import sys
+import time
+from threading import Lock
+
+# Формат файла захвата:
+#   заголовок: MAGIC, время начала (нс от эпохи), монотонное время начала (нс)
+#   записи:    тег (id порта * 2 + тип), время от предыдущей записи (мкс), длина данных, данные
+# Тег, время и длина - varint (7 бит на байт), поэтому заголовок типичного куска
+# с интервалом до 2 с занимает 5 байт вместо 15 при полях фиксированного размера.
+MAGIC = b"VESCAP02"
+FILE_HEADER = struct.Struct("<8sqq")
+
+RECORD_DATA = 0  # сырые байты из порта
+RECORD_PORT = 1  # объявление порта: данные - имя порта в UTF-8
+
+
+def _pack_varint(value, out):
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _unpack_varint(view, offset, size):
+    # Возвращает (значение, смещение после него) или None, если запись оборвана
+    value = 0
+    shift = 0
+    while offset < size:
+        byte = view[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+    return None
+
+
+def _unpack_record(view, offset, size):
+    # (тип, id порта, время от предыдущей записи в мкс, начало и конец данных) или None
+    fields = []
+    for _ in range(3):
+        field = _unpack_varint(view, offset, size)
+        if field is None:
+            return None
+        value, offset = field
+        fields.append(value)
+    tag, delta_us, length = fields
+    end = offset + length
+    if end > size:
+        return None
+    return tag & 1, tag >> 1, delta_us, offset, end
+
+
+class CaptureWriter:
+    # Дописывает сырые куски данных из порта в компактный двоичный файл
+    def __init__(self, path, buffer_size=256 * 1024):
+        self.path = path
+        self.lock = Lock()
+        self.ports = {}
+        self.closed = False
+        self.last_us = 0
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            # Продолжаем существующий файл: берем его время начала и список портов
+            reader = CaptureReader(path)
+            self.start_wall_ns = reader.start_wall_ns
+            self.ports = {name: port_id for port_id, name in reader.ports.items()}
+            self.last_us = reader.last_us
+            valid_size = reader.valid_size
+            reader.close()
+            self.start_mono_ns = time.monotonic_ns() - (time.time_ns() - self.start_wall_ns)
+            # Обрезаем недописанную запись, если программа была прервана
+            if valid_size < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(valid_size)
+        self.file = open(path, 'ab', buffering=buffer_size)
+        if is_new:
+            self.start_wall_ns = time.time_ns()
+            self.start_mono_ns = time.monotonic_ns()
+            self.file.write(FILE_HEADER.pack(MAGIC, self.start_wall_ns, self.start_mono_ns))
+
+    def _record(self, kind, port_id, timestamp_us, data):
+        # Время монотонное, но при продолжении старого файла оно считается от часов,
+        # которые могли уйти назад - разница не бывает отрицательной
+        header = bytearray()
+        _pack_varint(port_id << 1 | kind, header)
+        _pack_varint(max(timestamp_us - self.last_us, 0), header)
+        _pack_varint(len(data), header)
+        self.last_us = max(timestamp_us, self.last_us)
+        self.file.write(header)
+        self.file.write(data)
+
+    def _port_id(self, port_name, timestamp_us):
+        port_id = self.ports.get(port_name)
+        if port_id is None:
+            port_id = len(self.ports)
+            self.ports[port_name] = port_id
+            self._record(RECORD_PORT, port_id, timestamp_us, port_name.encode('utf-8'))
+        return port_id
+
+    def write(self, port_name, data):
+        timestamp_us = (time.monotonic_ns() - self.start_mono_ns) // 1000
+        with self.lock:
+            if self.closed:
+                # Поток чтения порта успел прочитать кусок уже после закрытия
+                return False
+            port_id = self._port_id(port_name, timestamp_us)
+            self._record(RECORD_DATA, port_id, timestamp_us, data)
+        return True
+
+    def flush(self):
+        with self.lock:
+            if not self.closed:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.file.close()
+
+
+class CaptureReader:
+    # Читает файл захвата через mmap; данные записей отдаются как memoryview без копирования
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < FILE_HEADER.size:
+            raise ValueError(f"Файл {path} не является файлом захвата")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, self.start_wall_ns, self.start_mono_ns = FILE_HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Файл {path} не является файлом захвата")
+        self.ports = {}
+        self.valid_size = FILE_HEADER.size
+        self.last_us = 0
+        self._offsets = None
+        # Первый проход: имена портов и граница последней целой записи
+        for _ in self._scan():
+            pass
+
+    def _scan(self):
+        # Время записей - накопленная сумма разниц, поэтому файл читается только подряд
+        view = self.view
+        size = len(view)
+        offset = FILE_HEADER.size
+        timestamp_us = 0
+        while offset < size:
+            record = _unpack_record(view, offset, size)
+            if record is None:
+                break
+            kind, port_id, delta_us, start, end = record
+            timestamp_us += delta_us
+            if kind == RECORD_PORT:
+                self.ports[port_id] = bytes(view[start:end]).decode('utf-8')
+            else:
+                yield offset, timestamp_us * 1000, port_id, start, end
+            offset = end
+            self.valid_size = offset
+            self.last_us = timestamp_us
+
+    def __iter__(self):
+        # (время от начала записи в нс, имя порта, memoryview с данными)
+        view = self.view
+        for offset, timestamp, port_id, start, end in self._scan():
+            yield timestamp, self.ports.get(port_id), view[start:end]
+
+    def index(self):
+        # Смещения и время всех записей данных - для быстрого поиска по времени
+        if self._offsets is None:
+            self._offsets = [(timestamp, offset) for offset, timestamp, _, _, _ in self._scan()]
+        return self._offsets
+
+    def records_from(self, timestamp_ns):
+        offsets = self.index()
+        position = bisect.bisect_left(offsets, (timestamp_ns, -1))
+        view = self.view
+        size = len(view)
+        for timestamp, offset in offsets[position:]:
+            _, port_id, _, start, end = _unpack_record(view, offset, size)
+            yield timestamp, self.ports.get(port_id), view[start:end]
+
+    def wall_time(self, timestamp_ns):
+        return (self.start_wall_ns + timestamp_ns) / 1e9
+
+    def replay(self, callback, speed=1.0, port_name=None):
+        # Воспроизведение с исходными интервалами (speed=0 - без задержек)
+        started = time.monotonic()
+        for timestamp, name, data in self:
+            if port_name is not None and name != port_name:
+                continue
+            if speed > 0:
+                delay = timestamp / 1e9 / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            callback(name, data)
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+        self.file.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python raw_capture.py <файл.cap> [--dump]")
+        sys.exit(1)
+
+    reader = CaptureReader(sys.argv[1])
+    count = 0
+    total = 0
+    for timestamp, port, data in reader:
+        count += 1
+        total += len(data)
+        if "--dump" in sys.argv:
+            moment = time.strftime("%H:%M:%S", time.localtime(reader.wall_time(timestamp)))
+            print(f"[{moment}] {port}: {data.hex()}")
+        data.release()
+    print(f"Записей: {count}, байт данных: {total}, порты: {', '.join(reader.ports.values())}")
+    reader.close()
@@ -0,0 +1,43 @@
+from collections import namedtuple
+
+Run = namedtuple("Run", "value start end count")
+
+# Результат RunCollapser.add
+NEW = "new"              # показание изменилось - началась новая серия
+REPEAT = "repeat"        # повтор, дальше не передается
+HEARTBEAT = "heartbeat"  # повтор, который пропускается раз в heartbeat секунд
+
+
+class RunCollapser:
+    # Сворачивает одинаковые подряд показания в серию (значение, начало, конец, количество).
+    # Интерфейс и сеть получают только изменения, а редкие повторы (HEARTBEAT) нужны,
+    # чтобы история, экспорт и статистика видели, что вес держался все это время.
+    def __init__(self, heartbeat=1.0):
+        self.heartbeat = heartbeat
+        self.last_run = None  # последняя закрытая серия
+        self.current = None  # [значение, начало, конец, количество, время последней передачи]
+
+    def add(self, timestamp, value):
+        current = self.current
+        if current is not None and current[0] == value:
+            current[2] = timestamp
+            current[3] += 1
+            if timestamp - current[4] >= self.heartbeat:
+                current[4] = timestamp
+                return HEARTBEAT
+            return REPEAT
+        if current is not None:
+            self.last_run = Run(*current[:4])
+        self.current = [value, timestamp, timestamp, 1, timestamp]
+        return NEW
+
+    @property
+    def current_run(self):
+        if self.current is None:
+            return None
+        return Run(*self.current[:4])
+
+    def reset(self):
+        if self.current is not None:
+            self.last_run = Run(*self.current[:4])
+        self.current = None
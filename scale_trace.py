@@ -0,0 +1,81 @@
+import signal
+
+# Категории трассировки
+RAW = "raw"        # сырые байты из порта
+FRAME = "frame"    # разбор кадров/строк, заголовки, запросы
+PARSE = "parse"    # декодирование веса
+UI = "ui"          # обновления интерфейса
+CATEGORIES = (RAW, FRAME, PARSE, UI)
+
+# Уровни
+DEBUG = 10
+INFO = 20
+OFF = 100
+
+
+class HexBytes:
+    # Отложенный hex-дамп: data.hex() вызывается только при реальном форматировании
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        return bytes(self.data).hex()
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+
+class Tracer:
+    # Трассировка по категориям и уровням, переключаемая на лету.
+    # Если категория выключена, trace() возвращается до форматирования строки,
+    # поэтому в рабочем режиме отладочный вывод почти ничего не стоит.
+    def __init__(self, sink, levels=None):
+        self.sink = sink
+        self.levels = {category: OFF for category in CATEGORIES}
+        if levels:
+            self.levels.update(levels)
+
+    def enabled(self, category, level=DEBUG):
+        return level >= self.levels.get(category, OFF)
+
+    def trace(self, category, fmt, *args, level=DEBUG):
+        if level < self.levels.get(category, OFF):
+            return
+        self.sink(f"[{category}] " + (fmt.format(*args) if args else fmt))
+
+    def set_level(self, category, level):
+        self.levels[category] = level
+
+    def set_enabled(self, category, enabled):
+        self.levels[category] = DEBUG if enabled else OFF
+
+    def toggle(self, category):
+        self.set_enabled(category, not self.enabled(category))
+        return self.enabled(category)
+
+    def disable_all(self):
+        for category in self.levels:
+            self.levels[category] = OFF
+
+    def install_signal_handlers(self, on_change=None):
+        # SIGUSR1 переключает трассировку сырых данных, SIGUSR2 выключает всё.
+        # На Windows этих сигналов нет - там переключение только из интерфейса.
+        def toggle_raw(signum, frame):
+            self.toggle(RAW)
+            if on_change is not None:
+                on_change()
+
+        def disable(signum, frame):
+            self.disable_all()
+            if on_change is not None:
+                on_change()
+
+        installed = False
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, toggle_raw)
+            installed = True
+        if hasattr(signal, 'SIGUSR2'):
+            signal.signal(signal.SIGUSR2, disable)
+        return installed
@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import json
+import re
+import sys
+import threading
+import time
+from queue import Queue, Empty
+
+# Мост COM-порт -> TCP: один процесс держит порт (exclusive=True),
+# а интерфейс, принтер этикеток и MES подключаются к нему по TCP.
+#   порт сырых данных:  клиент получает поток байт из порта как есть,
+#                       байты от клиента - команды прибору
+#   порт кадров:        клиент получает строки JSON по одной на кадр (строку CR LF)
+# Команды всех клиентов проходят через одну очередь и пишутся в порт по одной,
+# с паузой command_gap, чтобы команды разных клиентов не перемешивались.
+# Команды (тара, ноль, калибровка) принимаются без проверки клиента, поэтому по
+# умолчанию мост слушает только 127.0.0.1; другой адрес задается явно (--host).
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7000
+MAX_CLIENT_BUFFER = 1024 * 1024
+MAX_COMMAND = 256
+MAX_FRAME = 4096
+REOPEN_INTERVAL = 2.0
+
+NUMBER_RE = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+_STOP = object()
+
+
+class SimulatedScale:
+    # Заменитель порта для проверки без прибора: выдает строки в формате
+    # MIDL-MI-VDA ("W 12.345 kg") и понимает команду тары "Z\r\n"
+    def __init__(self, interval=0.1, weight=12.345, timeout=0.1):
+        self.interval = interval
+        self.weight = weight
+        self.timeout = timeout
+        self.zero = 0.0
+        self.port = "simulated"
+        self.is_open = True
+        self.commands = []
+        self.next_time = time.monotonic()
+
+    @property
+    def in_waiting(self):
+        return 1 if time.monotonic() >= self.next_time else 0
+
+    def read(self, size=1):
+        delay = self.next_time - time.monotonic()
+        if delay > self.timeout:
+            time.sleep(self.timeout)
+            return b""
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time += self.interval
+        return f"W {self.weight - self.zero:.3f} kg\r\n".encode('ascii')
+
+    def write(self, data):
+        self.commands.append(bytes(data))
+        if data.strip() in (b"Z", b"T"):
+            self.zero = self.weight
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+
+def open_port(port, baudrate=9600, bytesize=8, parity='N', stopbits=1):
+    if port == "simulate":
+        return SimulatedScale()
+    import serial
+    # serial_for_url понимает и обычные имена портов, и loop://, socket://, rfc2217://
+    return serial.serial_for_url(
+        port, baudrate=baudrate, bytesize=bytesize, parity=parity, stopbits=stopbits,
+        timeout=0.1, write_timeout=1.0, exclusive=True)
+
+
+def parse_frame(line):
+    match = NUMBER_RE.search(line)
+    return float(match.group()) if match else None
+
+
+class _RawClient(asyncio.Protocol):
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self.transport = None
+        self.command = bytearray()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.name = "{}:{}".format(*transport.get_extra_info("peername")[:2])
+        self.bridge.raw_clients.add(self)
+        print(f"Подключен клиент {self.name}")
+
+    def data_received(self, data):
+        # Команда уходит в очередь целиком: до CR LF или до MAX_COMMAND байт
+        self.command += data
+        while True:
+            end = self.command.find(b"\r\n")
+            if end < 0:
+                break
+            self.bridge.send_command(self.name, bytes(self.command[:end + 2]))
+            del self.command[:end + 2]
+        if len(self.command) >= MAX_COMMAND:
+            self.bridge.send_command(self.name, bytes(self.command))
+            self.command.clear()
+
+    def connection_lost(self, exc):
+        self.bridge.raw_clients.discard(self)
+        print(f"Отключен клиент {self.name}")
+
+
+class _FrameClient(asyncio.Protocol):
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.bridge.frame_clients.add(self)
+
+    def data_received(self, data):
+        pass
+
+    def connection_lost(self, exc):
+        self.bridge.frame_clients.discard(self)
+
+
+class SerialBridge:
+    # Поток чтения порта передает каждый принятый кусок в цикл asyncio,
+    # там один и тот же объект bytes пишется во все транспорты клиентов - без копий
+    # на каждого клиента. Клиент, который не успевает забирать данные
+    # (больше MAX_CLIENT_BUFFER в очереди на отправку), отключается:
+    # пропускать куски сырого потока нельзя, а ждать его - значит задерживать всех.
+    def __init__(self, opener, host=DEFAULT_HOST, port=DEFAULT_PORT, frames_port=None, command_gap=0.05):
+        self.opener = opener
+        self.host = host
+        self.port = port
+        self.frames_port = frames_port
+        self.command_gap = command_gap
+        self.serial = None
+        self.raw_clients = set()
+        self.frame_clients = set()
+        self.frame_buffer = bytearray()
+        self.commands = Queue()
+        self.running = threading.Event()
+        self.loop = None
+        self.servers = []
+        self.error = None
+        self.thread = None
+        self.threads = []
+        self._ready = threading.Event()
+
+    def start(self, timeout=5):
+        self.running.set()
+        self.thread = threading.Thread(target=self._run, name="bridge-loop", daemon=True)
+        self.thread.start()
+        self._ready.wait(timeout)
+        if self.error is not None:
+            self.running.clear()
+            raise self.error
+        for target, name in ((self._read_port, "bridge-reader"), (self._write_port, "bridge-writer")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self, timeout=5):
+        self.running.clear()
+        self.commands.put(_STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout)
+        self._close_port()
+
+    def send_command(self, client, data):
+        self.commands.put((client, data))
+
+    # Цикл asyncio: TCP-серверы и раздача данных
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.servers.append(self.loop.run_until_complete(
+                self.loop.create_server(lambda: _RawClient(self), self.host, self.port)))
+            if self.frames_port is not None:
+                self.servers.append(self.loop.run_until_complete(
+                    self.loop.create_server(lambda: _FrameClient(self), self.host, self.frames_port)))
+        except OSError as e:
+            self.error = e
+            for server in self.servers:
+                server.close()
+            self._ready.set()
+            self.loop.close()
+            return
+        self._ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            for server in self.servers:
+                server.close()
+            for client in list(self.raw_clients) + list(self.frame_clients):
+                client.transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def _fan_out(self, data):
+        for client in list(self.raw_clients):
+            self._write(client, data)
+        if self.frame_clients:
+            self._split_frames(data)
+        else:
+            self.frame_buffer.clear()
+
+    def _write(self, client, data):
+        transport = client.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            print(f"Клиент не успевает принимать данные, отключаем: "
+                  f"{transport.get_extra_info('peername')}")
+            transport.abort()
+            return
+        transport.write(data)
+
+    def _split_frames(self, data):
+        buffer = self.frame_buffer
+        buffer += data
+        start = 0
+        timestamp = time.time()
+        lines = []
+        while True:
+            end = buffer.find(b"\r\n", start)
+            if end < 0:
+                break
+            line = buffer[start:end].decode('ascii', errors='replace').strip()
+            start = end + 2
+            if line:
+                lines.append(json.dumps({"time": timestamp, "frame": line, "weight": parse_frame(line)},
+                                        ensure_ascii=False))
+        del buffer[:start]
+        if len(buffer) > MAX_FRAME:
+            buffer.clear()
+        if lines:
+            # Кадры сериализуются один раз для всех клиентов
+            message = ("\n".join(lines) + "\n").encode('utf-8')
+            for client in list(self.frame_clients):
+                self._write(client, message)
+
+    # Потоки порта: чтение и запись команд
+
+    def _open_port(self):
+        while self.running.is_set():
+            try:
+                self.serial = self.opener()
+                print(f"Порт открыт: {self.serial.port}")
+                return True
+            except Exception as e:
+                print(f"Не удалось открыть порт: {str(e)}")
+                time.sleep(REOPEN_INTERVAL)
+        return False
+
+    def _close_port(self):
+        port = self.serial
+        self.serial = None
+        if port is not None:
+            try:
+                port.close()
+            except Exception:
+                pass
+
+    def _read_port(self):
+        while self.running.is_set():
+            if self.serial is None and not self._open_port():
+                break
+            port = self.serial
+            try:
+                data = port.read(port.in_waiting or 1)
+            except Exception as e:
+                # Потеря порта (отключили USB-адаптер): закрываем и открываем заново
+                print(f"Ошибка чтения порта: {str(e)}")
+                self._close_port()
+                time.sleep(REOPEN_INTERVAL)
+                continue
+            if data:
+                self.loop.call_soon_threadsafe(self._fan_out, data)
+
+    def _write_port(self):
+        while True:
+            try:
+                item = self.commands.get(timeout=0.5)
+            except Empty:
+                if not self.running.is_set():
+                    break
+                continue
+            if item is _STOP:
+                break
+            client, data = item
+            port = self.serial
+            if port is None:
+                print(f"Порт закрыт, команда от {client} отброшена: {data!r}")
+                continue
+            try:
+                port.write(data)
+                print(f"Команда от {client}: {data!r}")
+            except Exception as e:
+                print(f"Ошибка отправки команды от {client}: {str(e)}")
+            time.sleep(self.command_gap)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Раздача данных весов из COM-порта по TCP")
+    parser.add_argument("port", help="порт (COM4, /dev/ttyUSB0, loop://, socket://host:port) "
+                                     "или simulate - имитация весов")
+    parser.add_argument("--baud", type=int, default=9600, help="скорость, бод")
+    parser.add_argument("--bytesize", type=int, default=8, help="бит данных")
+    parser.add_argument("--parity", default='N', help="четность: N, E, O")
+    parser.add_argument("--stopbits", type=float, default=1, help="стоп-бит")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="адрес для подключений (0.0.0.0 - все интерфейсы: команды прибору "
+                             "сможет отправить любой компьютер в сети)")
+    parser.add_argument("--tcp-port", type=int, default=DEFAULT_PORT, help="TCP-порт сырых данных и команд")
+    parser.add_argument("--frames-port", type=int, default=None, help="TCP-порт кадров в JSON")
+    args = parser.parse_args(argv)
+
+    stopbits = int(args.stopbits) if args.stopbits == int(args.stopbits) else args.stopbits
+    bridge = SerialBridge(
+        lambda: open_port(args.port, args.baud, args.bytesize, args.parity, stopbits),
+        args.host, args.tcp_port, args.frames_port)
+    try:
+        bridge.start()
+    except OSError as e:
+        print(f"Не удалось открыть TCP-порт: {str(e)}")
+        return 1
+    print(f"Мост запущен: {args.port} -> {args.host}:{args.tcp_port}"
+          + (f", кадры: {args.frames_port}" if args.frames_port else ""))
+    if args.host not in (DEFAULT_HOST, "localhost", "::1"):
+        print("Внимание: мост доступен из сети, команды прибору принимаются от любого клиента")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    bridge.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
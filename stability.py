@@ -0,0 +1,80 @@
+from collections import namedtuple
+from weight_stats import SlidingWindow
+
+# Событие "вес стабилизировался": время, средний вес окна, СКО и время успокоения (с)
+StableWeightEvent = namedtuple("StableWeightEvent", "timestamp weight std settle_time")
+
+
+class StabilityDetector:
+    # Детектор стабильного веса по дисперсии в скользящем окне.
+    # Вес считается стабильным, если СКО окна не превышает max_std в течение settle_time.
+    # Событие публикуется один раз на каждую успокоившуюся нагрузку.
+    def __init__(self, window_seconds=2.0, max_std=0.002, settle_time=0.5,
+                 min_samples=3, release_factor=2.0):
+        self.window = SlidingWindow(seconds=window_seconds)
+        self.max_std = max_std
+        self.settle_time = settle_time
+        self.min_samples = min_samples
+        self.release_factor = release_factor
+        self.subscribers = []
+        self.stable = False
+        self.stable_weight = None
+        self.quiet_since = None
+        self.motion_since = None
+
+    def subscribe(self, callback):
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    def add(self, timestamp, weight, stable_hint=None):
+        # stable_hint - бит стабильности от самих весов (Ньютон 42), если он есть
+        self.window.add(timestamp, weight)
+        std = self.window.std
+        quiet = self.window.count >= self.min_samples and std <= self.max_std
+        if stable_hint is False:
+            quiet = False
+
+        if self.stable:
+            # Гистерезис: снимаем стабильность только при заметном движении
+            if std > self.max_std * self.release_factor or stable_hint is False:
+                self.stable = False
+                self.quiet_since = None
+                self.motion_since = timestamp
+            return None
+
+        if self.motion_since is None:
+            self.motion_since = timestamp
+        if not quiet:
+            self.quiet_since = None
+            return None
+        if self.quiet_since is None:
+            self.quiet_since = timestamp
+        if timestamp - self.quiet_since < self.settle_time:
+            return None
+
+        self.stable = True
+        self.stable_weight = self.window.mean
+        event = StableWeightEvent(timestamp, self.stable_weight, std, timestamp - self.motion_since)
+        self.motion_since = None
+        for callback in list(self.subscribers):
+            callback(event)
+        return event
+
+    def configure(self, max_std=None, settle_time=None, window_seconds=None):
+        if max_std is not None:
+            self.max_std = max_std
+        if settle_time is not None:
+            self.settle_time = settle_time
+        if window_seconds is not None:
+            self.window.set_limits(seconds=window_seconds)
+
+    def reset(self):
+        self.window.clear()
+        self.stable = False
+        self.stable_weight = None
+        self.quiet_since = None
+        self.motion_since = None
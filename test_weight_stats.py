@@ -0,0 +1,34 @@
+import math
+import random
+import sys
+
+from weight_stats import SlidingWindow
+
+
+def exact_std(window):
+    weights = [weight for _, _, weight in window.samples]
+    mean = sum(weights) / len(weights)
+    return math.sqrt(sum((weight - mean) ** 2 for weight in weights) / (len(weights) - 1))
+
+
+def test_long_run_drift(count=1_000_000):
+    # Окно 2 с при 10 Гц на большом весе (15-20 т) с малым шумом:
+    # std и наклон окна не должны уплывать от точного значения при долгой работе
+    window = SlidingWindow(seconds=2)
+    rnd = random.Random(1)
+    timestamp = 1.7e9
+    for i in range(count):
+        timestamp += 0.1
+        base = 15000.0 if (i // 50000) % 2 == 0 else 20000.0
+        window.add(timestamp, base + rnd.gauss(0, 0.0005))
+        if i % 100000 == 99999:
+            std, exact = window.std, exact_std(window)
+            print(f"{i + 1:>9}: std {std:.7f}, точно {exact:.7f}, наклон {window.slope:.7f}")
+            assert abs(std - exact) < 1e-6, (std, exact)
+            assert abs(window.slope) < 0.01, window.slope
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    test_long_run_drift(count)
+    print("OK")
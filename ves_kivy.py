@@ -14,7 +14,13 @@ from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
 from kivy.uix.checkbox import CheckBox
 import serial
 import serial.tools.list_ports
+import time
+from collections import deque
 from datetime import datetime
+from kivy_chart import WeightChart  # регистрирует WeightChart для KV
+from kivy_log_view import LogView
+from stability import StabilityDetector
+from alerts import AlertManager
 
 # Увеличиваем максимальное количество итераций для Clock
 Clock.max_iteration = 200
@@ -107,6 +113,23 @@ kv = '''
                     id: connect_button
                     on_press: app.toggle_connection()
 
+            # Баннер оповещений
+            Label:
+                id: alert_label
+                text: ''
+                bold: True
+                color: 1, 1, 1, 1
+                halign: 'center'
+                size_hint_y: None
+                height: '44dp' if self.text else 0
+                opacity: 1 if self.text else 0
+                canvas.before:
+                    Color:
+                        rgba: 0.15, 0.68, 0.38, 1
+                    Rectangle:
+                        pos: self.pos
+                        size: self.size
+
             # Основная область с весом
             BoxLayout:
                 orientation: 'vertical'
@@ -169,13 +192,8 @@ kv = '''
                 orientation: 'vertical'
                 spacing: '10dp'
                 
-                ScrollView:
-                    TextInput:
-                        id: log_text
-                        readonly: True
-                        multiline: True
-                        background_color: 1, 1, 1, 1
-                        foreground_color: 0, 0, 0, 1
+                LogView:
+                    id: log_view
                         
                 Button:
                     text: 'Сохранить лог'
@@ -183,6 +201,15 @@ kv = '''
                     height: '44dp'
                     on_press: app.save_log_to_file()
 
+    TabbedPanelItem:
+        text: 'График'
+        BoxLayout:
+            orientation: 'vertical'
+            padding: '10dp'
+            
+            WeightChart:
+                id: weight_chart
+
     TabbedPanelItem:
         text: 'Настройки'
         BoxLayout:
@@ -283,13 +310,20 @@ class WeightScaleApp(App):
     def __init__(self):
         super().__init__()
         self.serial = None
-        self.weight_history = []
         self.max_history_points = 100
+        self.weight_history = deque(maxlen=self.max_history_points)
         self.current_unit = 'kg'
         self.units = {'kg': 1.0, 'g': 1000.0, 'lb': 2.20462}
         self.protocols = ["Auto", "MIDL-MI-VDA", "A&D", "Sartorius", "Ohaus"]
         self.current_protocol = None
         self.target_weight = None
+        # Целевой вес проверяется только по стабильному весу
+        self.stability = StabilityDetector()
+        self.stability.subscribe(self.on_stable_weight)
+        # Оповещения не открывают всплывающих окон и не тормозят прием данных
+        self.alerts = AlertManager()
+        self.alert_event = None
+        self.alert_hide_event = None
         try:
             self.sound = SoundLoader.load('beep.wav')
             if not self.sound:
@@ -302,12 +336,15 @@ class WeightScaleApp(App):
     def build(self):
         Window.size = (800, 600)
         Window.clearcolor = (0.95, 0.95, 0.95, 1)
-        return WeightScaleRoot()
+        root = WeightScaleRoot()
+        root.ids.weight_chart.history = self.weight_history
+        return root
 
     def on_start(self):
         # Инициализация таймера для обновления данных
         self.update_event = Clock.schedule_interval(self.read_data, 0.5)
         self.update_event.cancel()  # Начинаем с отключенным таймером
+        self.alert_event = Clock.schedule_interval(self.process_alerts, 0.1)
         self.refresh_ports()  # Перемещаем сюда вызов refresh_ports
 
     def refresh_ports(self):
@@ -387,12 +424,16 @@ class WeightScaleApp(App):
     def process_weight_value(self, weight_kg, unit, raw_data):
         converted_weight = weight_kg * self.units[self.current_unit]
         self.root.ids.weight_label.text = f"Вес: {converted_weight:.3f} {self.current_unit}"
-        
-        if self.target_weight is not None and abs(weight_kg - self.target_weight) < 0.001:
-            self.notify_target_weight_reached()
+        self.weight_history.append((time.time(), weight_kg))
+        self.stability.add(time.time(), weight_kg)
+        self.alerts.check_limits(time.time(), weight_kg)
         
         self.log_message(f"Получены данные: {raw_data}")
 
+    def on_stable_weight(self, event):
+        self.log_message(f"Стабильный вес: {event.weight:.3f} кг")
+        self.alerts.check_target(event.timestamp, event.weight)
+
     def change_unit(self, unit):
         self.current_unit = unit
         self.log_message(f"Изменена единица измерения на {unit}")
@@ -401,24 +442,32 @@ class WeightScaleApp(App):
         try:
             weight = float(self.root.ids.target_weight.text)
             self.target_weight = weight
+            self.alerts.set_target(weight)
             self.log_message(f"Установлен целевой вес: {weight} кг")
         except ValueError:
             self.show_popup("Ошибка", "Введите корректное значение веса")
 
     def clear_target_weight(self):
         self.target_weight = None
+        self.alerts.set_target(None)
         self.root.ids.target_weight.text = ""
         self.log_message("Целевой вес сброшен")
 
-    def notify_target_weight_reached(self):
-        if self.sound:
-            self.sound.play()
-        
-        self.show_popup(
-            "Целевой вес достигнут",
-            f"Достигнут целевой вес: {self.target_weight} кг"
-        )
-        self.clear_target_weight()
+    def process_alerts(self, dt):
+        for event in self.alerts.pop_events():
+            if not event.active:
+                continue
+            self.log_message(event.message)
+            self.show_alert_banner(event.message)
+            if self.sound and self.root.ids.sound_checkbox.active:
+                self.sound.play()
+
+    def show_alert_banner(self, message):
+        self.root.ids.alert_label.text = message
+        if self.alert_hide_event is not None:
+            self.alert_hide_event.cancel()
+        self.alert_hide_event = Clock.schedule_once(
+            lambda dt: setattr(self.root.ids.alert_label, 'text', ''), 5)
 
     def toggle_connection(self):
         if self.serial and self.serial.is_open:
@@ -538,7 +587,7 @@ class WeightScaleApp(App):
         try:
             filename = f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
             with open(filename, 'w', encoding='utf-8') as f:
-                f.write(self.root.ids.log_text.text)
+                f.write(self.root.ids.log_view.text())
             self.log_message(f"Лог сохранен в файл: {filename}")
         except Exception as e:
             self.show_popup("Ошибка", f"Не удалось сохранить файл: {str(e)}")
@@ -577,15 +626,16 @@ class WeightScaleApp(App):
 
     def log_message(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.root.ids.log_text.text += f"[{timestamp}] {message}\n"
-        # Прокрутка к последнему сообщению
-        self.root.ids.log_text.cursor = (0, len(self.root.ids.log_text.text))
+        # Строка попадет на экран в следующем кадре, прокрутка - внутри LogView
+        self.root.ids.log_view.append_line(f"[{timestamp}] {message}")
 
     def on_stop(self):
         if self.serial and self.serial.is_open:
             self.serial.close()
         if self.update_event:
             self.update_event.cancel()
+        if self.alert_event:
+            self.alert_event.cancel()
 
 if __name__ == '__main__':
     WeightScaleApp().run() 
\ No newline at end of file
@@ -1,5 +1,4 @@
 import sys
-import csv
 from datetime import datetime
 import wx
 import wx.adv
@@ -8,6 +7,7 @@ import serial.tools.list_ports
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
 from matplotlib.figure import Figure
 import wx.lib.agw.aui as aui
+from weight_export import ExportJob, write_csv, write_xlsx
 
 class WeightScaleApp(wx.Frame):
     def __init__(self):
@@ -31,6 +31,16 @@ class WeightScaleApp(wx.Frame):
         self.current_protocol = None
         self.target_weight = None
         self.timer = None
+        # Export ranges, counted back from the last point
+        self.export_spans = {
+            "Вся история": None,
+            "10 минут": 600,
+            "1 час": 3600,
+            "Смена (8 ч)": 8 * 3600
+        }
+        self.export_job = None
+        self.export_progress = None
+        self.export_timer = None
         
         self.init_ui()
         self.init_serial_settings()
@@ -293,6 +303,11 @@ class WeightScaleApp(wx.Frame):
         self.export_csv_button.Bind(wx.EVT_BUTTON, lambda e: self.on_export_data('csv'))
         self.export_excel_button.Bind(wx.EVT_BUTTON, lambda e: self.on_export_data('excel'))
         
+        self.export_span_choice = wx.Choice(panel, choices=list(self.export_spans.keys()))
+        self.export_span_choice.SetSelection(0)
+        
+        export_sizer.Add(wx.StaticText(panel, label="Экспорт:"), 0, wx.ALIGN_CENTER_VERTICAL | wx.ALL, 5)
+        export_sizer.Add(self.export_span_choice, 0, wx.ALL, 5)
         export_sizer.Add(self.export_csv_button, 0, wx.ALL, 5)
         export_sizer.Add(self.export_excel_button, 0, wx.ALL, 5)
         
@@ -789,22 +804,64 @@ class WeightScaleApp(wx.Frame):
                 file_name = dlg.GetPath()
         
         try:
+            # Export runs in the background, on_export_timer reports the result
             if format == 'csv':
                 self.export_to_csv(file_name)
             elif format == 'excel':
                 self.export_to_excel(file_name)
-            
-            self.log_message(f"Данные экспортированы в {file_name}")
         except Exception as e:
             wx.MessageBox(f"Не удалось экспортировать данные: {str(e)}", "Ошибка", wx.OK | wx.ICON_ERROR)
     
+    def export_time_range(self):
+        span = self.export_spans[self.export_span_choice.GetStringSelection()]
+        if span is None or not self.weight_history:
+            return None, None
+        return self.weight_history[-1][0] - span, None
+    
     def export_to_csv(self, file_name):
-        with open(file_name, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(["Время (с)", "Вес (kg)"])
-            
-            for time, weight in self.weight_history:
-                writer.writerow([time, weight])
+        time_from, time_to = self.export_time_range()
+        self.start_export_job(ExportJob.from_history(
+            file_name, write_csv, self.weight_history, time_from, time_to))
+    
+    def start_export_job(self, job):
+        if self.export_job is not None and not self.export_job.finished.is_set():
+            wx.MessageBox("Предыдущий экспорт еще не завершен", "Ошибка", wx.OK | wx.ICON_WARNING)
+            return
+        
+        self.export_job = job
+        self.export_progress = wx.ProgressDialog(
+            "Экспорт данных", f"Экспорт в {job.file_name}...", maximum=1000, parent=self,
+            style=wx.PD_CAN_ABORT | wx.PD_AUTO_HIDE | wx.PD_ELAPSED_TIME
+        )
+        job.start()
+        if self.export_timer is None:
+            self.export_timer = wx.Timer(self)
+            self.Bind(wx.EVT_TIMER, self.on_export_timer, self.export_timer)
+        self.export_timer.Start(100)
+    
+    def on_export_timer(self, event):
+        job = self.export_job
+        if job is None:
+            self.export_timer.Stop()
+            return
+        
+        if not job.finished.is_set():
+            keep_going, _ = self.export_progress.Update(int(job.progress * 999))
+            if not keep_going:
+                job.cancel()
+            return
+        
+        self.export_timer.Stop()
+        self.export_progress.Destroy()
+        self.export_progress = None
+        self.export_job = None
+        
+        if job.error is not None:
+            wx.MessageBox(f"Не удалось экспортировать данные: {str(job.error)}", "Ошибка", wx.OK | wx.ICON_ERROR)
+        elif job.cancelled:
+            self.log_message(f"Экспорт в {job.file_name} отменен")
+        else:
+            self.log_message(f"Данные экспортированы в {job.file_name} ({job.done} строк)")
     
     def export_to_excel(self, file_name):
         try:
@@ -817,19 +874,10 @@ class WeightScaleApp(wx.Frame):
             )
             return
         
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Данные весов"
-        
-        # Headers
-        ws.append(["Время (с)", "Вес (kg)"])
-        
-        # Data
-        for time, weight in self.weight_history:
-            ws.append([time, weight])
-        
-        # Save
-        wb.save(file_name)
+        # Rows are streamed into write-only sheets, split at the Excel row limit
+        time_from, time_to = self.export_time_range()
+        self.start_export_job(ExportJob.from_history(
+            file_name, write_xlsx, self.weight_history, time_from, time_to))
     
     def on_change_protocol(self, event):
         protocol = event.GetString()
@@ -1029,6 +1077,9 @@ class WeightScaleApp(wx.Frame):
         self.log_text.AppendText(f"[{timestamp}] {message}\n")
     
     def on_exit(self, event):
+        if self.export_job is not None:
+            self.export_job.cancel()
+            self.export_job.finished.wait(2)
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
         self.Close()
@@ -0,0 +1,424 @@
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_CLIENT_FRAME = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_HISTORY_POINTS = 100000
+MAX_EVENTS = 1000
+MAX_CACHED_RESPONSES = 256
+KEEP_ALIVE_TIMEOUT = 30
+
+# Опкоды WebSocket
+OP_TEXT = 0x1
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+INDEX_PAGE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>Весы</title>
+<style>
+body { font-family: sans-serif; background: #111; color: #eee; margin: 0; padding: 2vh 2vw; }
+.scale { margin-bottom: 3vh; }
+.name { font-size: 3vh; color: #aaa; }
+.weight { font-size: 14vh; font-weight: bold; }
+.stable { color: #2ecc71; }
+.offline { color: #777; }
+</style>
+</head>
+<body>
+<div id="scales"></div>
+<script>
+const scales = {};
+function render(m) {
+  let el = scales[m.scale];
+  if (!el) {
+    el = document.createElement("div");
+    el.className = "scale";
+    el.innerHTML = '<div class="name"></div><div class="weight"></div>';
+    el.querySelector(".name").textContent = m.scale;
+    document.getElementById("scales").appendChild(el);
+    scales[m.scale] = el;
+  }
+  const w = el.querySelector(".weight");
+  w.textContent = m.weight.toFixed(3) + " " + m.unit;
+  w.className = "weight" + (m.stable ? " stable" : "");
+}
+function connect() {
+  const ws = new WebSocket("ws://" + location.host + "/ws");
+  ws.onmessage = e => render(JSON.parse(e.data));
+  ws.onclose = () => {
+    Object.values(scales).forEach(el => el.querySelector(".weight").classList.add("offline"));
+    setTimeout(connect, 1000);
+  };
+}
+connect();
+</script>
+</body>
+</html>
+"""
+
+
+def websocket_frame(payload, opcode=OP_TEXT):
+    # Кадр сервера: без маски, FIN=1
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def read_websocket_frame(reader):
+    # Возвращает (опкод, данные); кадры клиента всегда с маской
+    first, second = await reader.readexactly(2)
+    opcode = first & 0x0F
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack("!Q", await reader.readexactly(8))
+    if length > MAX_CLIENT_FRAME:
+        raise ValueError("Слишком большой кадр от клиента")
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    data = bytearray(await reader.readexactly(length))
+    for i in range(length):
+        data[i] ^= mask[i % 4]
+    return opcode, bytes(data)
+
+
+class _Client:
+    # Для каждого клиента хранится только последнее сообщение по каждым весам:
+    # медленный клиент пропускает промежуточные значения, но не тормозит остальных
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = {}
+        self.event = asyncio.Event()
+
+    def push(self, scale, frame):
+        self.pending[scale] = frame
+        self.event.set()
+
+
+class WeightWebServer:
+    # Встроенный веб-сервер: страница с весами и WebSocket /ws с живыми значениями.
+    # Работает в своем потоке с отдельным циклом asyncio; publish() вызывается
+    # из потока приема данных и только записывает значение в словарь.
+    #
+    # HTTP API (JSON):
+    #   /api/latest[?scale=]                  последние значения
+    #   /api/history?scale=&from=&to=[&limit=] отсчеты за интервал из history(scale, from, to)
+    #   /api/events[?scale=&since=]           стабильные взвешивания после события с номером since
+    # Ответ сериализуется один раз и отдается из кэша, пока данные не изменились.
+    def __init__(self, host="127.0.0.1", port=8765, interval=0.05, unit="kg", history=None):
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.unit = unit
+        self.history = history
+        self.latest = {}      # весы -> (версия, время, вес, стабильность); заменяется целиком
+        self.version = 0
+        self.frames = {}      # весы -> (версия, готовый кадр WebSocket)
+        self.events = deque(maxlen=MAX_EVENTS)
+        self.event_id = 0
+        self.responses = {}   # запрос -> (версия данных, тело ответа)
+        self.clients = set()
+        self.connections = set()
+        self.loop = None
+        self.server = None
+        self.error = None
+        self.thread = None
+        self._ready = threading.Event()
+
+    def publish(self, scale, timestamp, weight, stable=False):
+        # Новый словарь вместо изменения старого: читатели в потоке сервера
+        # всегда видят целый снимок без блокировок
+        version = self.version + 1
+        latest = dict(self.latest)
+        latest[scale] = (version, timestamp, weight, stable)
+        self.latest = latest
+        self.version = version
+
+    def publish_event(self, scale, timestamp, weight, kind="stable", **data):
+        self.events.append(dict(data, id=self.event_id + 1, scale=scale, time=timestamp,
+                                weight=weight, kind=kind, unit=self.unit))
+        self.event_id += 1
+
+    def start(self, timeout=5):
+        self.thread = threading.Thread(target=self._run, name="web-server", daemon=True)
+        self.thread.start()
+        self._ready.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self
+
+    def stop(self, timeout=5):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self._shutdown)
+            self.thread.join(timeout)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_connection, self.host, self.port))
+        except OSError as e:
+            self.error = e
+            self._ready.set()
+            self.loop.close()
+            return
+        self._ready.set()
+        broadcaster = self.loop.create_task(self._broadcast())
+        try:
+            self.loop.run_forever()
+        finally:
+            broadcaster.cancel()
+            self.server.close()
+            for writer in list(self.connections):
+                writer.close()
+            # Обработчики подключений получают конец потока и завершаются сами
+            tasks = asyncio.all_tasks(self.loop)
+            if tasks:
+                self.loop.run_until_complete(asyncio.wait(tasks, timeout=1))
+            self.loop.close()
+
+    def _shutdown(self):
+        self.loop.stop()
+
+    def message(self, scale, timestamp, weight, stable):
+        return {"scale": scale, "time": timestamp, "weight": weight,
+                "stable": stable, "unit": self.unit}
+
+    def _frame(self, scale):
+        # Сериализация один раз на обновление, кадр общий для всех клиентов
+        entry = self.latest[scale]
+        cached = self.frames.get(scale)
+        if cached is not None and cached[0] == entry[0]:
+            return cached[1]
+        payload = json.dumps(self.message(scale, *entry[1:]), ensure_ascii=False).encode('utf-8')
+        frame = websocket_frame(payload)
+        self.frames[scale] = (entry[0], frame)
+        return frame
+
+    async def _broadcast(self):
+        # Объединение обновлений: не чаще одного сообщения по весам за interval
+        sent_version = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            version = self.version
+            if version == sent_version:
+                continue
+            changed = [scale for scale, entry in self.latest.items() if entry[0] > sent_version]
+            sent_version = version
+            for scale in changed:
+                frame = self._frame(scale)
+                for client in self.clients:
+                    client.push(scale, frame)
+
+    async def _read_request(self, reader, timeout):
+        # (метод, путь, версия, заголовки) или None, если клиент закрыл соединение
+        try:
+            request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError):
+            return None
+        if len(request) > MAX_HEADER_SIZE:
+            return None
+
+        lines = request.decode('latin-1').split("\r\n")
+        try:
+            method, path, version = lines[0].split(" ", 2)
+        except ValueError:
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        # Тело запроса API не использует, но его нужно пропустить для keep-alive
+        length = headers.get("content-length", "0")
+        if not length.isdigit() or int(length) > MAX_HEADER_SIZE:
+            return None
+        if int(length):
+            await reader.readexactly(int(length))
+        return method, path, version, headers
+
+    async def _handle_connection(self, reader, writer):
+        timeout = None
+        self.connections.add(writer)
+        try:
+            while True:
+                request = await self._read_request(reader, timeout)
+                if request is None:
+                    break
+                method, path, version, headers = request
+                if path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                    await self._serve_websocket(reader, writer, headers)
+                    break
+                connection = headers.get("connection", "").lower()
+                keep_alive = (connection != "close" if version == "HTTP/1.1"
+                              else connection == "keep-alive")
+                await self._serve_http(writer, method, path, keep_alive)
+                if not keep_alive:
+                    break
+                timeout = KEEP_ALIVE_TIMEOUT
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def _serve_http(self, writer, method, path, keep_alive):
+        url = urlsplit(path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        status, content_type, body = 200, "application/json", None
+        try:
+            if method not in ("GET", "HEAD"):
+                status, body = 405, self._error_body("Метод не поддерживается")
+            elif url.path in ("/", "/index.html"):
+                content_type, body = "text/html; charset=utf-8", INDEX_PAGE.encode('utf-8')
+            elif url.path == "/api/latest":
+                body = self._cached(path, self.version, lambda: self._latest_json(query))
+            elif url.path == "/api/events":
+                body = self._cached(path, self.event_id, lambda: self._events_json(query))
+            elif url.path == "/api/history":
+                cached = self.responses.get(path)
+                if cached is not None and cached[0] == self.version:
+                    body = cached[1]
+                else:
+                    # Большой интервал разбирается вне цикла событий, чтобы не задерживать рассылку
+                    version = self.version
+                    body = await asyncio.get_running_loop().run_in_executor(
+                        None, self._history_json, query)
+                    self._store(path, version, body)
+            else:
+                status, body = 404, self._error_body("Не найдено")
+        except ValueError as e:
+            status, body = 400, self._error_body(str(e))
+        self._send_response(writer, status, content_type, body, keep_alive,
+                            include_body=method != "HEAD")
+        await writer.drain()
+
+    def _cached(self, key, version, build):
+        cached = self.responses.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        body = build()
+        self._store(key, version, body)
+        return body
+
+    def _store(self, key, version, body):
+        if len(self.responses) >= MAX_CACHED_RESPONSES:
+            self.responses.clear()
+        self.responses[key] = (version, body)
+
+    def _json(self, data):
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+    def _error_body(self, text):
+        return self._json({"error": text})
+
+    def _latest_json(self, query):
+        latest = self.latest
+        scale = query.get("scale")
+        if scale is not None:
+            if scale not in latest:
+                raise ValueError(f"Нет данных по весам {scale}")
+            return self._json(self.message(scale, *latest[scale][1:]))
+        return self._json({"scales": [self.message(name, *entry[1:]) for name, entry in latest.items()]})
+
+    def _events_json(self, query):
+        since = int(query.get("since", 0))
+        scale = query.get("scale")
+        events = [event for event in list(self.events)
+                  if event["id"] > since and (scale is None or event["scale"] == scale)]
+        return self._json({"last_id": self.event_id, "events": events})
+
+    def _history_json(self, query):
+        if self.history is None:
+            raise ValueError("История недоступна")
+        scale = query.get("scale")
+        if scale is None:
+            raise ValueError("Не указаны весы (scale)")
+        time_from = float(query["from"]) if "from" in query else None
+        time_to = float(query["to"]) if "to" in query else None
+        limit = min(int(query.get("limit", MAX_HISTORY_POINTS)), MAX_HISTORY_POINTS)
+        points = []
+        truncated = False
+        for timestamp, weight in self.history(scale, time_from, time_to):
+            if len(points) >= limit:
+                truncated = True
+                break
+            points.append((round(timestamp, 3), weight))
+        return self._json({"scale": scale, "unit": self.unit, "truncated": truncated,
+                           "points": points})
+
+    def _send_response(self, writer, status, content_type, body, keep_alive=False,
+                       include_body=True):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                  405: "Method Not Allowed"}.get(status, "OK")
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n".encode('latin-1') + (body if include_body else b""))
+
+    async def _serve_websocket(self, reader, writer, headers):
+        key = headers.get("sec-websocket-key")
+        if not key:
+            self._send_response(writer, 400, "text/plain", b"Bad Request")
+            await writer.drain()
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n"
+            "\r\n".encode('latin-1'))
+
+        client = _Client(writer)
+        # Новому клиенту сразу отдаем последние значения всех весов
+        for scale in self.latest:
+            client.push(scale, self._frame(scale))
+        self.clients.add(client)
+        sender = asyncio.ensure_future(self._send_loop(client))
+        try:
+            while True:
+                opcode, data = await read_websocket_frame(reader)
+                if opcode == OP_CLOSE:
+                    writer.write(websocket_frame(data[:2], OP_CLOSE))
+                    break
+                if opcode == OP_PING:
+                    writer.write(websocket_frame(data, OP_PONG))
+        except ValueError:
+            pass
+        finally:
+            self.clients.discard(client)
+            sender.cancel()
+
+    async def _send_loop(self, client):
+        try:
+            while True:
+                await client.event.wait()
+                client.event.clear()
+                frames = list(client.pending.values())
+                client.pending.clear()
+                client.writer.write(b"".join(frames))
+                # Пока клиент не принял предыдущее, новые значения заменяют друг друга в pending
+                await client.writer.drain()
+        except ConnectionError:
+            client.writer.close()
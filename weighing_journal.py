@@ -0,0 +1,204 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from queue import Queue, Empty
+
+# Журнал операций взвешивания: файл только дописывается,
+# каждая запись - заголовок (длина, CRC32, номер, время) и JSON с данными.
+#   заголовок файла: MAGIC и номер первой записи
+# При открытии журнал читается до первой поврежденной записи, хвост обрезается.
+MAGIC = b"VESJRN01"
+FILE_HEADER = struct.Struct("<8sQ")
+RECORD_HEADER = struct.Struct("<IIQd")
+
+# Виды записей
+STABLE = "stable"      # стабильный вес
+TARE = "tare"          # тара/обнуление
+TARGET = "target"      # достигнут целевой вес
+OPERATOR = "operator"  # действие оператора (целевой вес, калибровка и т.п.)
+
+JournalRecord = namedtuple("JournalRecord", "seq timestamp kind data")
+
+_STOP = object()
+_COMPACT = object()
+
+
+def _pack(seq, timestamp, kind, data):
+    payload = json.dumps({"kind": kind, **data}, ensure_ascii=False).encode('utf-8')
+    crc = zlib.crc32(struct.pack("<Qd", seq, timestamp) + payload)
+    return RECORD_HEADER.pack(len(payload), crc, seq, timestamp) + payload
+
+
+def read_journal(path):
+    # Возвращает (номер первой записи, записи, размер целой части файла)
+    with open(path, 'rb') as f:
+        content = f.read()
+    if len(content) < FILE_HEADER.size:
+        return 1, [], 0
+    magic, first_seq = FILE_HEADER.unpack_from(content, 0)
+    if magic != MAGIC:
+        raise ValueError(f"Файл {path} не является журналом взвешиваний")
+
+    records = []
+    offset = FILE_HEADER.size
+    while offset + RECORD_HEADER.size <= len(content):
+        length, crc, seq, timestamp = RECORD_HEADER.unpack_from(content, offset)
+        start = offset + RECORD_HEADER.size
+        payload = content[start:start + length]
+        if len(payload) < length or zlib.crc32(struct.pack("<Qd", seq, timestamp) + payload) != crc:
+            break
+        data = json.loads(payload.decode('utf-8'))
+        kind = data.pop("kind")
+        records.append(JournalRecord(seq, timestamp, kind, data))
+        offset = start + length
+    return first_seq, records, offset
+
+
+class WeighingJournal:
+    # Записи ставятся в очередь, поток журнала пишет все накопившееся
+    # за commit_interval одним блоком и делает один fsync на группу.
+    # append(..., wait=True) возвращается только после того, как запись на диске.
+    def __init__(self, path="journal/weighings.jnl", commit_interval=0.2):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.queue = Queue()
+        self.error = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # Восстановление: записи, сохранившиеся до прошлого завершения или сбоя
+        if os.path.exists(path):
+            first_seq, self.recovered, valid_size = read_journal(path)
+        else:
+            first_seq, self.recovered, valid_size = 1, [], 0
+        if valid_size == 0:
+            self._write_file(path, first_seq, [])
+            valid_size = FILE_HEADER.size
+        self.next_seq = self.recovered[-1].seq + 1 if self.recovered else first_seq
+
+        self.file = open(path, 'r+b', buffering=0)
+        self.file.truncate(valid_size)
+        self.file.seek(valid_size)
+        self.lock = threading.Lock()
+
+        self.thread = threading.Thread(target=self._run, name="weighing-journal", daemon=True)
+        self.thread.start()
+
+    def _write_file(self, path, first_seq, records):
+        # Новый файл журнала пишется рядом и атомарно заменяет старый
+        temp = path + ".tmp"
+        with open(temp, 'wb') as f:
+            f.write(FILE_HEADER.pack(MAGIC, first_seq))
+            for record in records:
+                f.write(_pack(record.seq, record.timestamp, record.kind, record.data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+        _fsync_directory(path)
+
+    def append(self, kind, timestamp=None, wait=False, **data):
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+        record = _pack(seq, timestamp if timestamp is not None else time.time(), kind, data)
+        done = threading.Event() if wait else None
+        self.queue.put((record, done))
+        if done is not None:
+            done.wait()
+        return seq
+
+    def sync(self, timeout=5):
+        # Дождаться записи на диск всего, что уже в очереди
+        done = threading.Event()
+        self.queue.put((None, done))
+        return done.wait(timeout)
+
+    def compact(self, upto_seq, timeout=5):
+        # Записи до upto_seq включительно надежно перенесены в базу - убираем их из журнала.
+        # Номера записей продолжаются, поэтому повторное воспроизведение не создаст дублей.
+        done = threading.Event()
+        self.queue.put(((_COMPACT, upto_seq), done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put((_STOP, None))
+            self.thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            item = self.queue.get()
+            # Группа: все, что пришло за commit_interval после первой записи
+            group = [item]
+            deadline = time.monotonic() + self.commit_interval
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    group.append(self.queue.get(timeout=timeout))
+                except Empty:
+                    break
+
+            records = []
+            waiters = []
+            compact = []
+            for record, done in group:
+                if record is _STOP:
+                    stop = True
+                elif isinstance(record, tuple) and record[0] is _COMPACT:
+                    compact.append((record[1], done))
+                    continue
+                elif record is not None:
+                    records.append(record)
+                if done is not None:
+                    waiters.append(done)
+
+            self._commit(records)
+            for upto_seq, done in compact:
+                self._compact(upto_seq)
+                waiters.append(done)
+            for done in waiters:
+                done.set()
+        self.file.close()
+
+    def _commit(self, records):
+        if not records:
+            return
+        try:
+            self.file.write(b"".join(records))
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            self.error = e
+            print(f"Ошибка записи журнала взвешиваний: {str(e)}")
+
+    def _compact(self, upto_seq):
+        try:
+            self.file.close()
+            _, records, _ = read_journal(self.path)
+            keep = [record for record in records if record.seq > upto_seq]
+            self._write_file(self.path, upto_seq + 1, keep)
+            self.file = open(self.path, 'r+b', buffering=0)
+            self.file.seek(0, os.SEEK_END)
+            self.recovered = [record for record in self.recovered if record.seq > upto_seq]
+        except (OSError, ValueError) as e:
+            self.error = e
+            print(f"Ошибка сжатия журнала взвешиваний: {str(e)}")
+
+
+def _fsync_directory(path):
+    # Чтобы переименование файла тоже пережило сбой питания (на Windows не поддерживается)
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,255 @@
+import mmap
+import os
+import struct
+import time
+from array import array
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Архив отсчетов по дням: archive/<весы>/ГГГГММДД.seg
+#   заголовок файла: MAGIC, число знаков после запятой (u8), начало суток (мкс от эпохи)
+#   блоки:           заголовок блока (MAGIC, число строк, первое и последнее время),
+#                    затем колонки подряд: время (i64, мкс), показание (i32, дискреты), статус (u8)
+#   хвост:           индекс блоков (смещение, строк, первое, последнее время),
+#                    число блоков и INDEX_MAGIC
+# Хвост дописывается при закрытии; если его нет (сбой), индекс строится по заголовкам блоков.
+MAGIC = b"VESSEG01"
+CHUNK_MAGIC = b"CHNK"
+INDEX_MAGIC = b"VESIDX01"
+FILE_HEADER = struct.Struct("<8sBq")
+CHUNK_HEADER = struct.Struct("<4sIqq")
+INDEX_ENTRY = struct.Struct("<qIqq")
+INDEX_TRAILER = struct.Struct("<I8s")
+ROW_SIZE = 8 + 4 + 1
+
+# Биты статуса
+STATUS_STABLE = 1
+STATUS_OVERLOAD = 2
+STATUS_UNDERLOAD = 4
+
+
+def _chunk_size(rows):
+    return CHUNK_HEADER.size + rows * ROW_SIZE
+
+
+def _safe_name(scale):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in scale) or "scale"
+
+
+class SegmentReader:
+    # Чтение суточного сегмента через mmap. Колонки блоков отдаются срезами без копирования:
+    # np.ndarray при наличии numpy, иначе memoryview.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        if size < FILE_HEADER.size:
+            self.file.close()
+            raise ValueError(f"Файл {path} не является сегментом архива")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.decimals, self.day_start = FILE_HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Файл {path} не является сегментом архива")
+        self.chunks, self.data_end = self._load_index(size)
+        self._views = []
+
+    def _load_index(self, size):
+        # Индекс из хвоста, если файл закрыт штатно
+        if size >= FILE_HEADER.size + INDEX_TRAILER.size:
+            count, magic = INDEX_TRAILER.unpack_from(self.mmap, size - INDEX_TRAILER.size)
+            index_start = size - INDEX_TRAILER.size - count * INDEX_ENTRY.size
+            if magic == INDEX_MAGIC and index_start >= FILE_HEADER.size:
+                chunks = [INDEX_ENTRY.unpack_from(self.mmap, index_start + i * INDEX_ENTRY.size)
+                          for i in range(count)]
+                return chunks, index_start
+        # Иначе проходим по заголовкам блоков до последнего целого
+        chunks = []
+        offset = FILE_HEADER.size
+        while offset + CHUNK_HEADER.size <= size:
+            magic, rows, first, last = CHUNK_HEADER.unpack_from(self.mmap, offset)
+            if magic != CHUNK_MAGIC or offset + _chunk_size(rows) > size:
+                break
+            chunks.append((offset, rows, first, last))
+            offset += _chunk_size(rows)
+        return chunks, offset
+
+    def _columns(self, offset, rows):
+        start = offset + CHUNK_HEADER.size
+        if np is not None:
+            buffer = np.frombuffer(self.mmap, dtype=np.uint8, count=rows * ROW_SIZE, offset=start)
+            times = buffer[:rows * 8].view('<i8')
+            counts = buffer[rows * 8:rows * 12].view('<i4')
+            status = buffer[rows * 12:]
+            return times, counts, status
+        view = memoryview(self.mmap)
+        self._views.append(view)
+        times = view[start:start + rows * 8].cast('q')
+        counts = view[start + rows * 8:start + rows * 12].cast('i')
+        status = view[start + rows * 12:start + rows * 13]
+        return times, counts, status
+
+    def read(self, time_from=None, time_to=None):
+        # Возвращает списки колонок по блокам, попавшим в интервал (время в мкс)
+        result = []
+        for offset, rows, first, last in self.chunks:
+            if time_to is not None and first > time_to:
+                break
+            if time_from is not None and last < time_from:
+                continue
+            times, counts, status = self._columns(offset, rows)
+            start = 0
+            end = rows
+            if time_from is not None and first < time_from:
+                start = _bisect(times, time_from, 0, rows)
+            if time_to is not None and last > time_to:
+                end = _bisect(times, time_to + 1, start, rows)
+            if end > start:
+                result.append((times[start:end], counts[start:end], status[start:end]))
+        return result
+
+    def samples(self, time_from=None, time_to=None):
+        # Построчно: (время в секундах, вес, статус) - float, float, int.
+        # tolist() есть и у np.ndarray, и у memoryview: типы не зависят от наличия numpy
+        divisor = 10 ** self.decimals
+        for times, counts, status in self.read(time_from, time_to):
+            for t, c, s in zip(times.tolist(), counts.tolist(), status.tolist()):
+                yield t / 1e6, c / divisor, s
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+        self.file.close()
+
+
+def _bisect(column, value, low, high):
+    while low < high:
+        middle = (low + high) // 2
+        if column[middle] < value:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class _SegmentWriter:
+    def __init__(self, path, decimals, day_start):
+        self.path = path
+        self.decimals = decimals
+        self.chunks = []
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            # Продолжаем сегмент: берем индекс и отрезаем хвост (или недописанный блок)
+            reader = SegmentReader(path)
+            self.decimals = reader.decimals
+            self.chunks = reader.chunks
+            data_end = reader.data_end
+            reader.close()
+            self.file = open(path, 'r+b')
+            self.file.truncate(data_end)
+            self.file.seek(data_end)
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(MAGIC, decimals, day_start))
+
+    def write_chunk(self, times, counts, status):
+        offset = self.file.tell()
+        rows = len(times)
+        self.file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, rows, times[0], times[-1]))
+        self.file.write(times.tobytes())
+        self.file.write(counts.tobytes())
+        self.file.write(status.tobytes())
+        self.file.flush()
+        self.chunks.append((offset, rows, times[0], times[-1]))
+
+    def close(self):
+        for entry in self.chunks:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.write(INDEX_TRAILER.pack(len(self.chunks), INDEX_MAGIC))
+        self.file.close()
+
+
+class SegmentArchive:
+    # Архив отсчетов: показания копятся в буфере и дописываются блоками
+    # по chunk_rows строк или раз в flush_interval секунд
+    def __init__(self, root="archive", decimals=3, chunk_rows=4096, flush_interval=5.0):
+        self.root = root
+        self.decimals = decimals
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+        self.buffers = {}
+        self.writers = {}
+
+    def _segment_path(self, scale, day):
+        return os.path.join(self.root, _safe_name(scale), day.strftime("%Y%m%d") + ".seg")
+
+    def append(self, scale, timestamp, weight, status=0):
+        buffer = self.buffers.get(scale)
+        if buffer is None:
+            buffer = self.buffers[scale] = [array('q'), array('i'), array('B'), time.monotonic(), None]
+        day = datetime.fromtimestamp(timestamp).date()
+        if buffer[4] is not None and buffer[4] != day:
+            # Новые сутки - новый сегмент
+            self._flush_scale(scale)
+            self._close_writer(scale)
+        buffer[4] = day
+        buffer[0].append(int(timestamp * 1e6))
+        buffer[1].append(round(weight * 10 ** self.decimals))
+        buffer[2].append(status)
+        if len(buffer[0]) >= self.chunk_rows or time.monotonic() - buffer[3] >= self.flush_interval:
+            self._flush_scale(scale)
+
+    def _flush_scale(self, scale):
+        times, counts, status, _, day = self.buffers[scale]
+        self.buffers[scale][3] = time.monotonic()
+        if not times:
+            return
+        writer = self.writers.get(scale)
+        if writer is None:
+            path = self._segment_path(scale, day)
+            directory = os.path.dirname(path)
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            day_start = int(datetime.combine(day, datetime.min.time()).timestamp() * 1e6)
+            writer = self.writers[scale] = _SegmentWriter(path, self.decimals, day_start)
+        writer.write_chunk(times, counts, status)
+        self.buffers[scale][:3] = [array('q'), array('i'), array('B')]
+
+    def _close_writer(self, scale):
+        writer = self.writers.pop(scale, None)
+        if writer is not None:
+            writer.close()
+
+    def flush(self):
+        for scale in list(self.buffers):
+            self._flush_scale(scale)
+
+    def close(self):
+        self.flush()
+        for scale in list(self.writers):
+            self._close_writer(scale)
+
+    def samples(self, scale, time_from, time_to=None, flush=True):
+        # Отсчеты за интервал (секунды от эпохи) по всем суточным сегментам.
+        # Из другого потока - только с flush=False, сбросив буферы заранее в потоке записи
+        if flush and scale in self.buffers:
+            self._flush_scale(scale)
+        time_to = time_to if time_to is not None else time.time()
+        day = datetime.fromtimestamp(time_from).date()
+        last_day = datetime.fromtimestamp(time_to).date()
+        while day <= last_day:
+            path = self._segment_path(scale, day)
+            if os.path.exists(path):
+                reader = SegmentReader(path)
+                try:
+                    yield from reader.samples(int(time_from * 1e6), int(time_to * 1e6))
+                finally:
+                    reader.close()
+            day += timedelta(days=1)
@@ -0,0 +1,188 @@
+import os
+import struct
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+# Табло последних значений в общей памяти для других процессов терминала
+# (печать этикеток, запуск камеры): чтение без сокетов, файлов и системных вызовов.
+#   заголовок: MAGIC, число записей, размер записи, PID процесса-писателя
+#   запись:    счетчик seqlock, время, вес в дискретах, знаков после запятой, статус, имя весов
+#   статус:    флаги weight_archive.STATUS_*
+# Пишет один процесс. Перед изменением записи счетчик становится нечетным, после - четным;
+# читатель повторяет чтение, пока не получит одинаковый четный счетчик до и после.
+MAGIC = b"VESBRD02"
+BOARD_HEADER = struct.Struct("<8sIII4x")
+RECORD = struct.Struct("<I4xdqBB6x32s")
+SEQ = struct.Struct("<I")
+DEFAULT_NAME = "ves_weight_board"
+NAME_SIZE = 32
+
+BoardRecord = namedtuple("BoardRecord", "scale timestamp weight counts decimals status")
+
+
+def _attach(name):
+    # Читатель не должен удалять блок при выходе: до Python 3.13 resource_tracker
+    # считает подключенный блок своим и удаляет его вместе с процессом
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, "shared_memory")
+        except (ImportError, AttributeError):
+            pass
+        return memory
+
+
+def _process_alive(pid):
+    if pid <= 0:
+        return False
+    if os.name == 'nt':
+        # os.kill(pid, 0) в Windows завершает процесс, поэтому спрашиваем через WinAPI
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() == 5  # ERROR_ACCESS_DENIED: процесс есть, но чужой
+        try:
+            code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+            return code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WeightBoard:
+    # Сторона записи: процесс сбора данных, одна запись на весы
+    def __init__(self, name=DEFAULT_NAME, capacity=16, decimals=3):
+        self.capacity = capacity
+        self.decimals = decimals
+        self.divisor = 10 ** decimals
+        self.slots = {}
+        size = BOARD_HEADER.size + capacity * RECORD.size
+        try:
+            self.memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self.memory = self._take_over(name, size)
+        self.name = self.memory.name
+        self.buffer = self.memory.buf
+        # Сначала обнуляем записи, потом пишем заголовок: читатели старого писателя
+        # видят пустое табло, а не его последние значения
+        self.buffer[BOARD_HEADER.size:size] = bytes(size - BOARD_HEADER.size)
+        BOARD_HEADER.pack_into(self.buffer, 0, MAGIC, capacity, RECORD.size, os.getpid())
+
+    def _take_over(self, name, size):
+        # Блок с таким именем уже есть. Удалять его нельзя: к нему подключены читатели,
+        # а писатель может быть жив (второй экземпляр программы). Блок остался от
+        # аварийно завершившегося писателя - пишем в него же, читатели продолжают
+        # видеть табло. Иначе - ошибка.
+        # Проверяем без учета в resource_tracker, иначе он удалит блок при выходе
+        memory = _attach(name)
+        try:
+            if memory.size < BOARD_HEADER.size:
+                raise FileExistsError(f"Блок общей памяти {name} не является табло весов")
+            magic, capacity, record_size, pid = BOARD_HEADER.unpack_from(memory.buf, 0)
+            if magic != MAGIC or record_size != RECORD.size:
+                raise FileExistsError(f"Блок общей памяти {name} не является табло весов")
+            if pid != os.getpid() and _process_alive(pid):
+                raise FileExistsError(f"Табло {name} уже ведет процесс {pid}")
+            if memory.size < size:
+                raise FileExistsError(f"Табло {name} осталось от прошлого запуска, "
+                                      f"но меньше нужного ({capacity} записей вместо {self.capacity})")
+        finally:
+            memory.close()
+        # Блок теперь наш: открываем заново с учетом, как созданный
+        return shared_memory.SharedMemory(name=name)
+
+    def publish(self, scale, timestamp, weight, status=0):
+        slot = self.slots.get(scale)
+        if slot is None:
+            if len(self.slots) >= self.capacity:
+                return False
+            slot = self.slots[scale] = len(self.slots)
+        offset = BOARD_HEADER.size + slot * RECORD.size
+        buffer = self.buffer
+        seq = SEQ.unpack_from(buffer, offset)[0]
+        SEQ.pack_into(buffer, offset, (seq + 1) & 0xFFFFFFFF)
+        RECORD.pack_into(buffer, offset, (seq + 1) & 0xFFFFFFFF, timestamp,
+                         int(round(weight * self.divisor)), self.decimals, status,
+                         scale.encode('utf-8')[:NAME_SIZE])
+        SEQ.pack_into(buffer, offset, (seq + 2) & 0xFFFFFFFF)
+        return True
+
+    def close(self, unlink=True):
+        if self.buffer is None:
+            return
+        self.buffer.release()
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+
+
+class WeightBoardReader:
+    # Сторона чтения: любой локальный процесс Python.
+    # Запись разбирается прямо из общей памяти (struct.unpack_from), без копирования блока
+    def __init__(self, name=DEFAULT_NAME, retries=1000):
+        self.memory = _attach(name)
+        self.buffer = self.memory.buf
+        self.retries = retries
+        magic, self.capacity, record_size, self.writer_pid = BOARD_HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"Блок общей памяти {name} не является табло весов")
+        self.slots = {}
+
+    def _read_slot(self, slot):
+        offset = BOARD_HEADER.size + slot * RECORD.size
+        buffer = self.buffer
+        for _ in range(self.retries):
+            seq, timestamp, counts, decimals, status, raw_name = RECORD.unpack_from(buffer, offset)
+            if seq & 1:
+                continue
+            if SEQ.unpack_from(buffer, offset)[0] == seq:
+                if seq == 0:
+                    return None
+                return BoardRecord(raw_name.rstrip(b"\0").decode('utf-8', errors='replace'),
+                                   timestamp, counts / 10 ** decimals, counts, decimals, status)
+        # Писатель остановился посреди записи (аварийно завершился) - значение недостоверно
+        return None
+
+    def read(self, scale):
+        slot = self.slots.get(scale)
+        if slot is not None:
+            record = self._read_slot(slot)
+            if record is not None and record.scale == scale:
+                return record
+        for record_slot in range(self.capacity):
+            record = self._read_slot(record_slot)
+            if record is None:
+                break
+            self.slots[record.scale] = record_slot
+            if record.scale == scale:
+                return record
+        return None
+
+    def read_all(self):
+        records = []
+        for slot in range(self.capacity):
+            record = self._read_slot(slot)
+            if record is None:
+                break
+            records.append(record)
+        return records
+
+    def close(self):
+        if self.buffer is None:
+            return
+        self.buffer.release()
+        self.buffer = None
+        self.memory.close()
@@ -0,0 +1,166 @@
+import bisect
+import csv
+import os
+import threading
+from datetime import datetime
+
+CSV_HEADER = ["Время (с)", "Вес (kg)"]
+# Заголовок для истории с абсолютным временем (секунды от эпохи)
+WALL_CLOCK_HEADER = ["Время", "Вес (kg)"]
+CHUNK_ROWS = 10000
+CSV_BUFFER_SIZE = 1024 * 1024
+# Предел строк на листе Excel (вместе с заголовком)
+EXCEL_MAX_ROWS = 1048576
+EXCEL_SHEET_TITLE = "Данные весов"
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def history_range(rows, time_from=None, time_to=None):
+    # rows - последовательность (время, вес), упорядоченная по времени
+    start = bisect.bisect_left(rows, (time_from,)) if time_from is not None else 0
+    end = bisect.bisect_right(rows, (time_to, float('inf'))) if time_to is not None else len(rows)
+    return start, max(end, start)
+
+
+def history_chunks(rows, start, end, chunk_rows=CHUNK_ROWS):
+    # Выдача строк кусками, чтобы запись шла через writerows и проверка отмены была редкой
+    for position in range(start, end, chunk_rows):
+        yield rows[position:min(position + chunk_rows, end)]
+
+
+def wall_clock_chunks(chunks):
+    # Секунды от эпохи -> дата и время: в файле точки из архива до запуска программы
+    # идут в одной шкале с точками сеанса
+    for chunk in chunks:
+        yield [(datetime.fromtimestamp(timestamp), weight) for timestamp, weight in chunk]
+
+
+def write_csv(file_name, chunks, job, header=CSV_HEADER):
+    with open(file_name, 'w', newline='', encoding='utf-8', buffering=CSV_BUFFER_SIZE) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(header)
+        for chunk in chunks:
+            job.check_cancelled()
+            writer.writerows(chunk)
+            job.advance(len(chunk))
+
+
+def write_xlsx(file_name, chunks, job, header=CSV_HEADER, title=EXCEL_SHEET_TITLE,
+               extra_sheets=None, max_rows=EXCEL_MAX_ROWS):
+    # Книга в режиме write_only: строки сразу уходят во временные файлы openpyxl,
+    # поэтому память не растет с длиной сессии. При достижении предела строк
+    # данные продолжаются на следующем листе.
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = None
+    sheet_count = 0
+    sheet_rows = max_rows
+
+    def next_sheet():
+        nonlocal ws, sheet_count, sheet_rows
+        sheet_count += 1
+        ws = wb.create_sheet(title if sheet_count == 1 else f"{title} ({sheet_count})")
+        ws.append(header)
+        sheet_rows = 1
+
+    for chunk in chunks:
+        job.check_cancelled()
+        position = 0
+        while position < len(chunk):
+            if sheet_rows >= max_rows:
+                next_sheet()
+            part = chunk[position:position + max_rows - sheet_rows]
+            for row in part:
+                ws.append(row)
+            sheet_rows += len(part)
+            position += len(part)
+        job.advance(len(chunk))
+
+    if ws is None:
+        next_sheet()
+
+    # Небольшие дополнительные листы (статистика и т.п.): имя -> строки
+    for name, rows in (extra_sheets or {}).items():
+        extra = wb.create_sheet(name)
+        for row in rows:
+            extra.append(row)
+
+    job.check_cancelled()
+    wb.save(file_name)
+
+
+class ExportJob:
+    # Экспорт в отдельном потоке. Пишется во временный файл, который заменяет
+    # целевой только после успешного завершения; при отмене или ошибке удаляется.
+    # Интерфейс опрашивает done/total/finished по таймеру.
+    def __init__(self, file_name, writer, chunks, total, on_finished=None, **writer_args):
+        self.file_name = file_name
+        self.writer = writer
+        self.chunks = chunks
+        self.total = total
+        self.done = 0
+        self.error = None
+        self.cancelled = False
+        self.on_finished = on_finished
+        self.writer_args = writer_args
+        self.cancel_event = threading.Event()
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="export", daemon=True)
+
+    @classmethod
+    def from_history(cls, file_name, writer, rows, time_from=None, time_to=None, **kwargs):
+        # Снимок истории берется сразу, чтобы поток не зависел от ее изменения
+        rows = list(rows)
+        start, end = history_range(rows, time_from, time_to)
+        return cls(file_name, writer, history_chunks(rows, start, end), end - start, **kwargs)
+
+    @classmethod
+    def from_snapshot(cls, file_name, writer, snapshot, wall_clock=False, **kwargs):
+        # snapshot - неизменяемый срез CompressedHistory, блоки распаковываются в потоке экспорта.
+        # wall_clock - время в истории абсолютное, в файл пишется дата и время
+        chunks = snapshot.chunks()
+        if wall_clock:
+            chunks = wall_clock_chunks(chunks)
+            kwargs.setdefault("header", WALL_CLOCK_HEADER)
+        return cls(file_name, writer, chunks, snapshot.count, **kwargs)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise ExportCancelled()
+
+    def advance(self, count):
+        self.done += count
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    def _run(self):
+        temp = self.file_name + ".part"
+        try:
+            self.writer(temp, self.chunks, self, **self.writer_args)
+            os.replace(temp, self.file_name)
+        except ExportCancelled:
+            self.cancelled = True
+        except Exception as e:
+            self.error = e
+        finally:
+            if os.path.exists(temp):
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+            self.finished.set()
+            if self.on_finished is not None:
+                self.on_finished(self)
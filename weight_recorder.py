@@ -0,0 +1,244 @@
+import json
+import sqlite3
+import threading
+import time
+from queue import Queue, Empty
+
+_STOP = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scales (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS samples (
+    scale_id INTEGER NOT NULL REFERENCES scales(id),
+    time REAL NOT NULL,
+    weight REAL NOT NULL,
+    stable INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS samples_scale_time ON samples (scale_id, time);
+CREATE TABLE IF NOT EXISTS weighings (
+    id INTEGER PRIMARY KEY,
+    scale_id INTEGER NOT NULL REFERENCES scales(id),
+    time REAL NOT NULL,
+    weight REAL NOT NULL,
+    unit TEXT NOT NULL DEFAULT 'kg',
+    kind TEXT NOT NULL DEFAULT 'stable',
+    mode TEXT,
+    std REAL,
+    note TEXT,
+    seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS weighings_scale_time ON weighings (scale_id, time);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    scale_id INTEGER NOT NULL REFERENCES scales(id),
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    data TEXT,
+    seq INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_scale_time ON events (scale_id, time);
+"""
+
+# Виды взвешиваний
+STABLE = "stable"    # автоматически по событию стабилизации
+MANUAL = "manual"    # кнопка "Записать"
+TARGET = "target"    # достигнут целевой вес
+
+
+class WeightRecorder:
+    # Непрерывная запись в SQLite. Вызывающий код только кладет записи в очередь,
+    # поток записи вставляет их пачками - одна транзакция на пачку.
+    # WAL позволяет читать базу (запросы, экспорт) параллельно с записью,
+    # а после сбоя питания база остается целой.
+    def __init__(self, path="weights.db", batch_size=2000, flush_interval=0.5,
+                 synchronous="NORMAL"):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.queue = Queue()
+        self.error = None
+
+        # Схему создаем сразу, чтобы ошибки открытия базы были видны вызывающему коду
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        self._migrate(connection)
+        connection.close()
+
+        self.thread = threading.Thread(target=self._run, name="weight-recorder", daemon=True)
+        self.thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={self.synchronous}")
+        return connection
+
+    def _migrate(self, connection):
+        # Базы, созданные до появления журнала, не имеют колонки seq
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(weighings)")]
+        if "seq" not in columns:
+            connection.execute("ALTER TABLE weighings ADD COLUMN seq INTEGER")
+        # Номер записи журнала: повторное воспроизведение журнала не создает дублей
+        connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS weighings_seq ON weighings (seq) WHERE seq IS NOT NULL")
+        connection.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS events_seq ON events (seq) WHERE seq IS NOT NULL")
+        connection.commit()
+
+    def add_sample(self, scale, timestamp, weight, stable=False):
+        self.queue.put(("sample", scale, (timestamp, weight, 1 if stable else 0)))
+
+    def add_weighing(self, scale, timestamp, weight, unit="kg", kind=STABLE, mode=None,
+                     std=None, note=None, seq=None):
+        self.queue.put(("weighing", scale, (timestamp, weight, unit, kind, mode, std, note, seq)))
+
+    def add_event(self, scale, timestamp, kind, data=None, seq=None):
+        # Операции без веса: тара, калибровка, установка и сброс целевого веса
+        self.queue.put(("event", scale, (timestamp, kind,
+                                         json.dumps(data, ensure_ascii=False) if data else None, seq)))
+
+    def flush(self, timeout=5):
+        # Дождаться, пока все поставленные в очередь записи окажутся в базе
+        done = threading.Event()
+        self.queue.put(("flush", None, done))
+        return done.wait(timeout)
+
+    def sync(self, timeout=10):
+        # То же, что flush, но с контрольной точкой WAL: после возврата записи
+        # переживут сбой питания даже при synchronous=NORMAL
+        done = threading.Event()
+        self.queue.put(("sync", None, done))
+        return done.wait(timeout)
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+
+    def _run(self):
+        connection = self._connect()
+        scale_ids = {}
+        samples = []
+        weighings = []
+        events = []
+        waiters = []
+        checkpoint = False
+        last_flush = time.monotonic()
+        stop = False
+
+        while not stop:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                item = None
+
+            if item is _STOP:
+                stop = True
+            elif item is not None:
+                kind, scale, values = item
+                if kind == "sample":
+                    samples.append((self._scale_id(connection, scale_ids, scale),) + values)
+                elif kind == "weighing":
+                    weighings.append((self._scale_id(connection, scale_ids, scale),) + values)
+                elif kind == "event":
+                    events.append((self._scale_id(connection, scale_ids, scale),) + values)
+                else:
+                    waiters.append(values)
+                    checkpoint = checkpoint or kind == "sync"
+
+            now = time.monotonic()
+            # Взвешивания, события и явный flush пишутся сразу, отсчеты - пачками
+            if (stop or waiters or weighings or events or len(samples) >= self.batch_size
+                    or now - last_flush >= self.flush_interval):
+                if samples or weighings or events:
+                    self._write_batch(connection, samples, weighings, events)
+                    samples = []
+                    weighings = []
+                    events = []
+                if checkpoint:
+                    try:
+                        connection.execute("PRAGMA wal_checkpoint(FULL)")
+                    except sqlite3.Error as e:
+                        self.error = e
+                    checkpoint = False
+                for done in waiters:
+                    done.set()
+                waiters = []
+                last_flush = now
+
+        connection.close()
+
+    def _scale_id(self, connection, scale_ids, name):
+        scale_id = scale_ids.get(name)
+        if scale_id is None:
+            with connection:
+                connection.execute("INSERT OR IGNORE INTO scales (name) VALUES (?)", (name,))
+            scale_id = connection.execute(
+                "SELECT id FROM scales WHERE name = ?", (name,)).fetchone()[0]
+            scale_ids[name] = scale_id
+        return scale_id
+
+    def _write_batch(self, connection, samples, weighings, events=()):
+        try:
+            with connection:
+                if samples:
+                    connection.executemany(
+                        "INSERT INTO samples (scale_id, time, weight, stable) VALUES (?, ?, ?, ?)",
+                        samples)
+                if weighings:
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO weighings "
+                        "(scale_id, time, weight, unit, kind, mode, std, note, seq) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        weighings)
+                if events:
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO events (scale_id, time, kind, data, seq) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        events)
+        except sqlite3.Error as e:
+            self.error = e
+            print(f"Ошибка записи в базу весов: {str(e)}")
+
+    # Чтение - отдельным соединением, параллельно с записью
+
+    def query_samples(self, scale, time_from=None, time_to=None):
+        return self._query(
+            "SELECT s.time, s.weight, s.stable FROM samples s JOIN scales c ON c.id = s.scale_id "
+            "WHERE c.name = ? AND s.time >= ? AND s.time <= ? ORDER BY s.time",
+            scale, time_from, time_to)
+
+    def query_weighings(self, scale, time_from=None, time_to=None):
+        return self._query(
+            "SELECT w.time, w.weight, w.unit, w.kind, w.mode, w.std, w.note "
+            "FROM weighings w JOIN scales c ON c.id = w.scale_id "
+            "WHERE c.name = ? AND w.time >= ? AND w.time <= ? ORDER BY w.time",
+            scale, time_from, time_to)
+
+    def query_events(self, scale, time_from=None, time_to=None):
+        return self._query(
+            "SELECT e.time, e.kind, e.data FROM events e JOIN scales c ON c.id = e.scale_id "
+            "WHERE c.name = ? AND e.time >= ? AND e.time <= ? ORDER BY e.time",
+            scale, time_from, time_to)
+
+    def scales(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            return [row[0] for row in connection.execute("SELECT name FROM scales ORDER BY id")]
+        finally:
+            connection.close()
+
+    def _query(self, sql, scale, time_from, time_to):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            return connection.execute(sql, (
+                scale,
+                time_from if time_from is not None else float("-inf"),
+                time_to if time_to is not None else float("inf"),
+            )).fetchall()
+        finally:
+            connection.close()
@@ -0,0 +1,100 @@
+from collections import deque
+
+# Уровни агрегации: разрешение (с) и сколько строк храним на уровне
+# 1 с - час, 10 с - сутки, 1 мин - неделя, 10 мин - 30 суток
+ROLLUP_LEVELS = [
+    (1, 3600),
+    (10, 8640),
+    (60, 10080),
+    (600, 4320),
+]
+
+
+class RollupBucket:
+    __slots__ = ('start', 'min', 'max', 'sum', 'count', 'last')
+
+    def __init__(self, start, value):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.sum = value
+        self.count = 1
+        self.last = value
+
+    def add(self, value):
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count
+
+
+class RollupLevel:
+    def __init__(self, resolution, max_rows):
+        self.resolution = resolution
+        self.rows = deque(maxlen=max_rows)
+        self.current = None
+
+    def add(self, timestamp, value):
+        start = timestamp - timestamp % self.resolution
+        if self.current is not None and self.current.start == start:
+            self.current.add(value)
+            return
+        if self.current is not None:
+            self.rows.append(self.current)
+        self.current = RollupBucket(start, value)
+
+    def span(self):
+        # Интервал времени, который покрывает уровень с учетом ограничения строк
+        return self.resolution * self.rows.maxlen
+
+    def rows_since(self, time_from):
+        # Идем с конца, чтобы не перебирать всю историю уровня
+        result = []
+        if self.current is not None and self.current.start >= time_from:
+            result.append(self.current)
+        for bucket in reversed(self.rows):
+            if bucket.start < time_from:
+                break
+            result.append(bucket)
+        result.reverse()
+        return result
+
+
+class RollupPyramid:
+    def __init__(self, levels=None):
+        self.levels = [RollupLevel(res, rows) for res, rows in (levels or ROLLUP_LEVELS)]
+        self.last_timestamp = None
+
+    def add(self, timestamp, value):
+        # Каждый отсчет обновляет агрегаты всех уровней за O(1)
+        for level in self.levels:
+            level.add(timestamp, value)
+        self.last_timestamp = timestamp
+
+    def select_level(self, span, max_points=2000):
+        # Самый подробный уровень, который уложится в max_points и хранит весь интервал
+        for level in self.levels:
+            if span / level.resolution <= max_points and level.span() >= span:
+                return level
+        return self.levels[-1]
+
+    def window(self, span, max_points=2000, now=None):
+        if now is None:
+            now = self.last_timestamp
+        if now is None:
+            return None, []
+        level = self.select_level(span, max_points)
+        return level, level.rows_since(now - span)
+
+    def clear(self):
+        for level in self.levels:
+            level.rows.clear()
+            level.current = None
+        self.last_timestamp = None
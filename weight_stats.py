@@ -0,0 +1,201 @@
+import math
+from collections import deque
+
+# Окна статистики по умолчанию: название -> длительность в секундах
+DEFAULT_WINDOWS = {
+    "10 с": 10,
+    "1 мин": 60,
+    "10 мин": 600,
+}
+
+
+class SlidingWindow:
+    # Скользящее окно по времени и/или количеству точек.
+    # Все величины обновляются за O(1) (амортизированно) на каждый отсчет.
+    def __init__(self, seconds=None, max_count=None):
+        self.seconds = seconds
+        self.max_count = max_count
+        self.samples = deque()
+        self.seq = 0
+        # Welford: среднее и сумма квадратов отклонений
+        self.mean = 0.0
+        self.m2 = 0.0
+        # Монотонные очереди (номер, вес) для минимума и максимума
+        self.min_queue = deque()
+        self.max_queue = deque()
+        # Суммы для наклона (МНК), время отсчитывается от t0 - первой точки окна
+        # на момент последнего пересчета
+        self.t0 = None
+        self.sum_t = 0.0
+        self.sum_tt = 0.0
+        self.sum_tw = 0.0
+        self.rebase_seq = 0
+
+    def add(self, timestamp, weight):
+        if self.t0 is None:
+            self.t0 = timestamp
+            self.rebase_seq = self.seq + 1
+        seq = self.seq
+        self.seq += 1
+        self.samples.append((seq, timestamp, weight))
+
+        n = len(self.samples)
+        delta = weight - self.mean
+        self.mean += delta / n
+        self.m2 += delta * (weight - self.mean)
+
+        while self.min_queue and self.min_queue[-1][1] >= weight:
+            self.min_queue.pop()
+        self.min_queue.append((seq, weight))
+        while self.max_queue and self.max_queue[-1][1] <= weight:
+            self.max_queue.pop()
+        self.max_queue.append((seq, weight))
+
+        t = timestamp - self.t0
+        self.sum_t += t
+        self.sum_tt += t * t
+        self.sum_tw += t * weight
+
+        self._evict(timestamp)
+
+    def _evict(self, now):
+        while self.samples:
+            seq, timestamp, weight = self.samples[0]
+            expired = self.seconds is not None and now - timestamp > self.seconds
+            overflow = self.max_count is not None and len(self.samples) > self.max_count
+            if not (expired or overflow):
+                break
+            self._remove_oldest()
+
+    def _remove_oldest(self):
+        seq, timestamp, weight = self.samples.popleft()
+        n = len(self.samples)
+        if n == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            self.t0 = None
+            self.sum_t = self.sum_tt = self.sum_tw = 0.0
+            self.min_queue.clear()
+            self.max_queue.clear()
+            return
+
+        # Обратный шаг Welford
+        old_mean = self.mean
+        self.mean = (old_mean * (n + 1) - weight) / n
+        self.m2 -= (weight - old_mean) * (weight - self.mean)
+        if self.m2 < 0:
+            self.m2 = 0.0
+
+        if self.min_queue and self.min_queue[0][0] == seq:
+            self.min_queue.popleft()
+        if self.max_queue and self.max_queue[0][0] == seq:
+            self.max_queue.popleft()
+
+        t = timestamp - self.t0
+        self.sum_t -= t
+        self.sum_tt -= t * t
+        self.sum_tw -= t * weight
+
+        # Все точки, бывшие в окне при прошлом пересчете, вытеснены: переносим t0
+        # на первую точку и считаем суммы, среднее и m2 заново. Иначе при долгой
+        # непрерывной работе sum_tt и sum_tw растут без предела, а ошибка округления
+        # обратного шага Welford накапливается (на большом весе, например 15-20 т,
+        # std через сутки в разы больше настоящего и весы перестают быть стабильными).
+        # Пересчет O(n) бывает не чаще чем раз на n вытеснений - амортизированно O(1)
+        if self.samples[0][0] >= self.rebase_seq:
+            self._rebase()
+
+    def _rebase(self):
+        self.t0 = self.samples[0][1]
+        self.sum_t = self.sum_tt = self.sum_tw = 0.0
+        total = 0.0
+        for _, timestamp, weight in self.samples:
+            t = timestamp - self.t0
+            self.sum_t += t
+            self.sum_tt += t * t
+            self.sum_tw += t * weight
+            total += weight
+        # Среднее и m2 - в два прохода, без накопленной ошибки
+        self.mean = total / len(self.samples)
+        self.m2 = 0.0
+        for _, _, weight in self.samples:
+            self.m2 += (weight - self.mean) ** 2
+        self.rebase_seq = self.seq
+
+    def set_limits(self, seconds=None, max_count=None):
+        self.seconds = seconds
+        self.max_count = max_count
+        if self.samples:
+            self._evict(self.samples[-1][1])
+
+    @property
+    def count(self):
+        return len(self.samples)
+
+    @property
+    def variance(self):
+        n = len(self.samples)
+        return self.m2 / (n - 1) if n > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self):
+        return self.min_queue[0][1] if self.min_queue else None
+
+    @property
+    def max(self):
+        return self.max_queue[0][1] if self.max_queue else None
+
+    @property
+    def slope(self):
+        # Скорость изменения веса (кг/с) по методу наименьших квадратов
+        n = len(self.samples)
+        if n < 2:
+            return 0.0
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if denominator <= 1e-12:
+            return 0.0
+        sum_w = self.mean * n
+        return (n * self.sum_tw - self.sum_t * sum_w) / denominator
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.mean if self.samples else None,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            "slope": self.slope,
+        }
+
+    def clear(self):
+        self.__init__(self.seconds, self.max_count)
+
+
+class ScaleStats:
+    # Набор окон статистики для одних весов
+    def __init__(self, windows=None):
+        self.windows = {
+            name: SlidingWindow(seconds=seconds)
+            for name, seconds in (windows or DEFAULT_WINDOWS).items()
+        }
+        self.last = None
+
+    def add(self, timestamp, weight):
+        for window in self.windows.values():
+            window.add(timestamp, weight)
+        self.last = (timestamp, weight)
+
+    def __getitem__(self, name):
+        return self.windows[name]
+
+    def snapshot(self):
+        return {name: window.snapshot() for name, window in self.windows.items()}
+
+    def clear(self):
+        for window in self.windows.values():
+            window.clear()
+        self.last = None
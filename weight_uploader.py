@@ -0,0 +1,371 @@
+import argparse
+import gzip
+import json
+import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+
+# Выгрузка взвешиваний и отсчетов на центральный сервер.
+# Записи сначала попадают в локальную очередь (SQLite), поэтому переживают
+# перезапуск и недоступность сервера. Отправка - пачками JSON со сжатием gzip,
+# одним POST на пачку, не больше concurrency пачек одновременно.
+# Каждая запись несет ключ uid: у взвешивания он строится из номера записи журнала
+# (terminal:weighing:seq), у отсчета - случайный. Повторно отправленную запись
+# сервер распознает по uid, даже если локальная очередь была создана заново.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    name TEXT PRIMARY KEY,
+    value INTEGER
+);
+CREATE TABLE IF NOT EXISTS rejected (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    body TEXT NOT NULL,
+    error TEXT
+);
+"""
+
+# Виды записей
+WEIGHING = "weighing"
+SAMPLE = "sample"
+
+# Ответы сервера, после которых пачка не отправляется повторно, а уходит в rejected
+REJECTED_STATUSES = (400, 413, 422)
+
+_STOP = object()
+
+
+class UploadError(Exception):
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class WeightUploader:
+    # Поток очереди пишет новые записи в базу пачками (как WeightRecorder),
+    # поток отправки выбирает из базы пачки и отдает их пулу из concurrency потоков.
+    # При ошибке пачка остается в памяти и повторяется с растущей паузой
+    # (retry_min ... retry_max); новые пачки в это время не отправляются.
+    # Пачку, которую сервер отклонил как некорректную (400, 413, 422), переносим
+    # в таблицу rejected, чтобы она не останавливала очередь; вернуть ее можно
+    # командой requeue.
+    def __init__(self, url, path="upload_queue.db", terminal=None, token=None,
+                 batch_size=500, concurrency=2, timeout=30, flush_interval=1.0,
+                 retry_min=1.0, retry_max=60.0):
+        self.url = url
+        self.path = path
+        self.terminal = terminal or socket.gethostname()
+        self.token = token
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.retry_min = retry_min
+        self.retry_max = retry_max
+        self.queue = Queue()
+        self.stopping = threading.Event()
+        self.wakeup = threading.Event()
+        self.error = None
+        self.sent = 0
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        row = connection.execute("SELECT value FROM state WHERE name = 'last_seq'").fetchone()
+        connection.close()
+        # Последний номер записи журнала, уже поставленный в очередь
+        self.last_seq = row[0] if row else 0
+
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="upload")
+        self.store_thread = threading.Thread(target=self._store, name="upload-store", daemon=True)
+        self.store_thread.start()
+        self.send_thread = threading.Thread(target=self._dispatch, name="upload-dispatch", daemon=True)
+        self.send_thread.start()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def add_weighing(self, scale, timestamp, weight, unit="kg", seq=None, **data):
+        # Взвешивание с номером записи журнала, который уже в очереди, повторно не ставится
+        if seq is not None:
+            if seq <= self.last_seq:
+                return False
+            self.last_seq = seq
+        uid = f"{self.terminal}:{WEIGHING}:{seq}" if seq is not None else uuid.uuid4().hex
+        self.queue.put((WEIGHING, dict(data, uid=uid, seq=seq, scale=scale, time=timestamp,
+                                       weight=weight, unit=unit)))
+        return True
+
+    def add_sample(self, scale, timestamp, weight, stable=False):
+        self.queue.put((SAMPLE, {"uid": uuid.uuid4().hex, "scale": scale, "time": timestamp,
+                                 "weight": weight, "stable": bool(stable)}))
+
+    def flush(self, timeout=5):
+        # Дождаться, пока поставленные записи окажутся в локальной очереди
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def pending(self):
+        connection = sqlite3.connect(self.path, timeout=10)
+        try:
+            return connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        finally:
+            connection.close()
+
+    def close(self, timeout=None):
+        # Неотправленное остается в базе и уйдет после следующего запуска
+        if self.store_thread.is_alive():
+            self.queue.put(_STOP)
+            self.store_thread.join()
+        self.stopping.set()
+        self.wakeup.set()
+        self.send_thread.join(timeout)
+
+    # Поток очереди
+
+    def _store(self):
+        connection = self._connect()
+        rows = []
+        waiters = []
+        last_seq = None
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except Empty:
+                item = None
+            if item is _STOP:
+                stop = True
+            elif item is not None:
+                kind, data = item
+                if kind == "flush":
+                    waiters.append(data)
+                else:
+                    rows.append((kind, json.dumps(data, ensure_ascii=False)))
+                    if data.get("seq") is not None:
+                        last_seq = max(last_seq or 0, data["seq"])
+
+            now = time.monotonic()
+            if stop or waiters or len(rows) >= self.batch_size or now - last_flush >= self.flush_interval:
+                if rows:
+                    try:
+                        # Записи и номер последней записи журнала - в одной транзакции
+                        with connection:
+                            connection.executemany("INSERT INTO outbox (kind, body) VALUES (?, ?)", rows)
+                            if last_seq is not None:
+                                connection.execute(
+                                    "INSERT INTO state (name, value) VALUES ('last_seq', ?) "
+                                    "ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+                                    (last_seq,))
+                        self.wakeup.set()
+                    except sqlite3.Error as e:
+                        self.error = e
+                        print(f"Ошибка записи в очередь выгрузки: {str(e)}")
+                    rows = []
+                    last_seq = None
+                for done in waiters:
+                    done.set()
+                waiters = []
+                last_flush = now
+        connection.close()
+
+    # Поток отправки
+
+    def _dispatch(self):
+        connection = self._connect()
+        cursor = 0            # последний номер записи, выбранной для отправки
+        in_flight = {}        # future -> пачка
+        retry = []            # пачки, которые нужно повторить
+        retry_at = 0.0
+        delay = self.retry_min
+
+        while True:
+            # Результаты завершенных отправок
+            for future, batch in list(in_flight.items()):
+                if not future.done():
+                    continue
+                del in_flight[future]
+                ids = [(row[0],) for row in batch]
+                try:
+                    future.result()
+                    with connection:
+                        connection.executemany("DELETE FROM outbox WHERE id = ?", ids)
+                    self.sent += len(batch)
+                    delay = self.retry_min
+                except UploadError as e:
+                    if e.retry:
+                        retry.append(batch)
+                        retry_at = time.monotonic() + delay * random.uniform(0.5, 1.0)
+                        print(f"Ошибка выгрузки, повтор через {delay:.1f} с: {str(e)}")
+                        delay = min(delay * 2, self.retry_max)
+                    else:
+                        print(f"Сервер отклонил пачку из {len(batch)} записей: {str(e)}")
+                        with connection:
+                            connection.executemany(
+                                "INSERT OR REPLACE INTO rejected (id, kind, body, error) VALUES (?, ?, ?, ?)",
+                                [row + (str(e),) for row in batch])
+                            connection.executemany("DELETE FROM outbox WHERE id = ?", ids)
+                except sqlite3.Error as e:
+                    self.error = e
+                    print(f"Ошибка очереди выгрузки: {str(e)}")
+
+            if self.stopping.is_set() and not in_flight:
+                break
+
+            # Новые отправки: сначала повторы, затем новые записи из базы
+            while not self.stopping.is_set() and len(in_flight) < self.concurrency:
+                if retry:
+                    if time.monotonic() < retry_at:
+                        break
+                    batch = retry.pop(0)
+                elif retry_at > time.monotonic() or (in_flight and delay > self.retry_min):
+                    # Пока сервер не ответил на повтор, новые пачки не отправляем
+                    break
+                else:
+                    batch = connection.execute(
+                        "SELECT id, kind, body FROM outbox WHERE id > ? ORDER BY id LIMIT ?",
+                        (cursor, self.batch_size)).fetchall()
+                    if not batch:
+                        break
+                    cursor = batch[-1][0]
+                in_flight[self.executor.submit(self._post, batch)] = batch
+
+            self.wakeup.wait(0.1 if in_flight or retry else self.flush_interval)
+            self.wakeup.clear()
+
+        self.executor.shutdown(wait=True)
+        connection.close()
+
+    def _post(self, batch):
+        records = [dict(json.loads(body), id=record_id, record=kind) for record_id, kind, body in batch]
+        payload = gzip.compress(json.dumps(
+            {"terminal": self.terminal, "records": records},
+            ensure_ascii=False, separators=(",", ":")).encode('utf-8'), compresslevel=6)
+        request = urllib.request.Request(self.url, data=payload, method="POST", headers={
+            "Content-Type": "application/json",
+            "Content-Encoding": "gzip",
+            "X-Batch-Id": f"{self.terminal}-{batch[0][0]}-{batch[-1][0]}",
+        })
+        if self.token:
+            request.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # Окончательно отклоняется только содержимое пачки. 401/403/404 и прочее -
+            # токен, адрес или обслуживание сервера: повторяем, пока не исправят
+            raise UploadError(f"HTTP {e.code} {e.reason}", retry=e.code not in REJECTED_STATUSES)
+        except (urllib.error.URLError, OSError) as e:
+            raise UploadError(str(getattr(e, 'reason', e)))
+        finally:
+            self.wakeup.set()
+
+
+def serve(host, port, fail_rate=0.0, delay=0.0):
+    # Заменитель центрального сервера для проверки: принимает пачки,
+    # отбрасывает повторы по uid, иногда отвечает ошибкой (fail_rate)
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    seen = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if delay:
+                time.sleep(delay)
+            if random.random() < fail_rate:
+                self.send_response(503)
+                self.end_headers()
+                return
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip.decompress(body)
+            data = json.loads(body)
+            with lock:
+                new = 0
+                for record in data["records"]:
+                    key = record.get("uid") or (data["terminal"], record["id"])
+                    if key not in seen:
+                        seen.add(key)
+                        new += 1
+                total = len(seen)
+            print(f"{self.headers.get('X-Batch-Id')}: записей {len(data['records'])}, "
+                  f"новых {new}, всего {total}")
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Сервер приема запущен: http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка данных весов на центральный сервер")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    server = commands.add_parser("serve", help="запустить тестовый сервер приема")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8080)
+    server.add_argument("--fail-rate", type=float, default=0.0, help="доля ответов 503")
+    server.add_argument("--delay", type=float, default=0.0, help="задержка ответа, с")
+
+    status = commands.add_parser("status", help="состояние локальной очереди")
+    status.add_argument("queue", nargs="?", default="upload_queue.db", help="файл очереди")
+
+    requeue = commands.add_parser("requeue", help="вернуть отклоненные сервером записи в очередь")
+    requeue.add_argument("queue", nargs="?", default="upload_queue.db", help="файл очереди")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.fail_rate, args.delay)
+        return 0
+
+    connection = sqlite3.connect(args.queue, timeout=10)
+    try:
+        if args.command == "requeue":
+            # Новые номера в очереди, uid в записи прежний - сервер не примет их дважды
+            with connection:
+                moved = connection.execute(
+                    "INSERT INTO outbox (kind, body) SELECT kind, body FROM rejected ORDER BY id").rowcount
+                connection.execute("DELETE FROM rejected")
+            print(f"Возвращено в очередь: {moved}")
+        pending = connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+        rejected = connection.execute("SELECT COUNT(*) FROM rejected").fetchone()[0]
+    except sqlite3.Error as e:
+        print(f"Ошибка чтения очереди {args.queue}: {str(e)}")
+        return 1
+    finally:
+        connection.close()
+    print(f"Ожидают отправки: {pending}, отклонено сервером: {rejected}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())